@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY = 'auth_token:{digest}'
+
+# Кеши, которые живут в памяти одного процесса: сброс в них
+# не дойдёт до других воркеров.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def get_cache_key(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return TOKEN_KEY.format(digest=digest)
+
+
+class TokenCache:
+    """
+    Соответствие токен → пользователь.
+
+    В памяти процесса хранится не больше AUTH_TOKEN_CACHE_SIZE
+    записей, вытесняются давно не использованные; каждая живёт
+    AUTH_TOKEN_CACHE_LOCAL_TTL секунд. За ними стоит общий кеш
+    (CACHES['default']) со сроком AUTH_TOKEN_CACHE_TTL. Сброс
+    удаляет запись из общего кеша и из памяти своего процесса;
+    другие воркеры видят его не позже чем через LOCAL_TTL.
+    Если CACHES['default'] хранится в памяти процесса (LocMemCache),
+    общий уровень не используется: иначе сброс доходил бы до других
+    воркеров только через AUTH_TOKEN_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_shared_cache(self):
+        """
+        Общий кеш токенов или None, если CACHES['default'] не общий
+        для воркеров.
+        """
+        shared = caches['default']
+        if isinstance(shared, PROCESS_LOCAL_CACHES):
+            return None
+        return shared
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, user = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return user
+                del self._entries[key]
+        shared = self.get_shared_cache()
+        if shared is None:
+            return None
+        user = shared.get(get_cache_key(key))
+        if user is not None:
+            self.remember(key, user)
+        return user
+
+    def remember(self, key, user):
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_LOCAL_TTL
+        with self._lock:
+            self._entries[key] = (expires, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def set(self, key, user):
+        shared = self.get_shared_cache()
+        if shared is not None:
+            shared.set(
+                get_cache_key(key), user, settings.AUTH_TOKEN_CACHE_TTL
+            )
+        self.remember(key, user)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        shared = self.get_shared_cache()
+        if shared is not None:
+            shared.delete_many([get_cache_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который берёт пользователя по токену
+    из token_cache и обращается к базе только при промахе.
+    Записи сбрасываются сигналами (api.signals) при удалении
+    токена и при сохранении пользователя: выход, смена пароля,
+    деактивация, изменение профиля.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user, Token(key=key, user=user)
@@ -0,0 +1,29 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name, workers):
+    """
+    Пул потоков name из workers потоков, один на процесс.
+    """
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=name
+            )
+    return executor
+
+
+def run_in_background(name, workers, function, *args):
+    """
+    Ставит function(*args) в фоновый пул потоков name;
+    при workers = 0 выполняет сразу в текущем потоке.
+    """
+    if workers:
+        get_executor(name, workers).submit(function, *args)
+    else:
+        function(*args)
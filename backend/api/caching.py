@@ -0,0 +1,94 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """
+    Сильный ETag из произвольных частей представления.
+    """
+    content = repr(parts).encode()
+    return quote_etag(hashlib.sha1(content).hexdigest())
+
+
+def to_timestamp(value):
+    if value is None:
+        return None
+    return timegm(value.utctimetuple())
+
+
+def patch_caching_headers(request, response, etag=None, last_modified=None):
+    """
+    Валидаторы и Cache-Control для ответа на чтение.
+
+    Анонимные ответы одинаковы для всех и могут храниться
+    в общих кешах (proxy_cache в nginx) ANONYMOUS_CACHE_MAX_AGE
+    секунд; ответы с токеном — только в кеше клиента и только
+    с перепроверкой. Vary: Authorization не даёт отдать
+    анонимную копию запросу с токеном.
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(to_timestamp(last_modified))
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.ANONYMOUS_CACHE_MAX_AGE
+        )
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list и retrieve.
+
+    get_list_validators и get_object_validators возвращают пару
+    (etag, last_modified), вычисленную лёгким запросом, или None,
+    если представление нельзя проверить без его построения.
+    При совпадении с If-None-Match / If-Modified-Since отдаётся 304
+    без выборки и сериализации страницы.
+    """
+
+    def get_list_validators(self):
+        return None
+
+    def get_object_validators(self):
+        return None
+
+    def conditional_response(self, request, get_validators, handler,
+                             *args, **kwargs):
+        etag = last_modified = None
+        validators = get_validators()
+        if validators is not None:
+            etag, last_modified = validators
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=to_timestamp(last_modified)
+            )
+            if response is not None:
+                return patch_caching_headers(
+                    request, response, etag, last_modified
+                )
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            patch_caching_headers(request, response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.get_list_validators, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.get_object_validators, super().retrieve,
+            *args, **kwargs
+        )
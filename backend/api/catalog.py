@@ -0,0 +1,73 @@
+import hashlib
+import json
+
+from api.versions import VersionedState
+from recipes.models import Ingredient, Tag
+
+VERSION_KEY = 'catalog:{name}:version'
+
+
+class Catalog(VersionedState):
+    """
+    Справочник в памяти процесса.
+
+    Данные загружаются из базы один раз на версию (VersionedState),
+    поэтому сброс справочника сигналом в одном воркере виден всем
+    остальным: при следующем запросе они перечитают данные.
+    """
+
+    def __init__(self, name, fields, queryset):
+        super().__init__()
+        self.name = name
+        self.fields = fields
+        self.queryset = queryset
+        self.version_key = VERSION_KEY.format(name=name)
+
+    def get_state(self):
+        version = self.get_version()
+        state = self._state
+        if state is None or state['version'] != version:
+            items = list(self.queryset.all().values(*self.fields))
+            content = json.dumps(items, ensure_ascii=False).encode()
+            state = {
+                'version': version,
+                'items': items,
+                'by_id': {item['id']: item for item in items},
+                'etag': '"{}"'.format(hashlib.sha1(content).hexdigest()),
+            }
+            self._state = state
+        return state
+
+    def all(self):
+        return self.get_state()['items']
+
+    def get(self, pk):
+        return self.get_state()['by_id'].get(pk)
+
+    def etag(self):
+        return self.get_state()['etag']
+
+
+tags_catalog = Catalog(
+    'tags', ('id', 'name', 'color', 'slug'), Tag.objects.order_by('id')
+)
+ingredients_catalog = Catalog(
+    'ingredients', ('id', 'name', 'measurement_unit'),
+    Ingredient.objects.order_by('id')
+)
+
+
+def get_tag_ids():
+    """
+    Соответствие slug → id для всех тегов.
+    """
+    state = tags_catalog.get_state()
+    if 'by_slug' not in state:
+        state['by_slug'] = {
+            item['slug']: item['id'] for item in state['items']
+        }
+    return state['by_slug']
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
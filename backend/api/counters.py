@@ -0,0 +1,59 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# (модель, поле-счётчик, связанная модель, поле связи).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет счётчик на delta без чтения строки.
+    Рассинхронизированный счётчик не уходит в минус:
+    такие строки исправляет manage.py recount.
+    """
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """
+    То же, что change_counter, для нескольких строк одним запросом.
+    """
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, relation):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{relation: OuterRef('pk')}
+        ).order_by().values(relation).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def recount():
+    """
+    Пересчитывает все счётчики по связанным таблицам;
+    возвращает количество исправленных строк по каждому счётчику.
+    """
+    fixed = {}
+    for model, field, related_model, relation in COUNTERS:
+        actual = actual_count(related_model, relation)
+        fixed[f'{model.__name__}.{field}'] = model.objects.annotate(
+            actual=actual
+        ).exclude(**{field: F('actual')}).count()
+        model.objects.update(**{field: actual})
+    return fixed
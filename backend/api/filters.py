@@ -1,28 +1,21 @@
+from api.catalog import get_tag_choices, get_tag_ids
+from api.recipe_search import search_recipes
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Ingredient, Recipe
-
-
-class IngredientFilter(FilterSet):
-    """
-    Фильтр для поиска по названию ингредиента.
-    """
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='icontains'
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+from recipes.models import Recipe
 
 
 class RecipeFilter(FilterSet):
     """
     Фильтр рецептов по тегам, по добавлению в избранное,
-    и по добавлениею в список покупок.
+    и по добавлениею в список покупок; полнотекстовый поиск
+    по названию и тексту.
     """
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
@@ -33,14 +26,31 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search'
+        )
+
+    def filter_tags(self, queryset, name, value):
+        # Полусоединение вместо JOIN: рецепт с несколькими подходящими
+        # тегами попадает в выборку один раз, и DISTINCT не нужен.
+        if not value:
+            return queryset
+        tag_ids = get_tag_ids()
+        return queryset.filter(
+            pk__in=Recipe.tags.through.objects.filter(
+                tag_id__in=[tag_ids[slug] for slug in value]
+            ).values('recipe_id')
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(shopping_carts__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,164 @@
+import binascii
+import hashlib
+import logging
+import os
+import tempfile
+from io import BytesIO
+
+from api.background import run_in_background
+from api.instrumentation import track_job
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+from PIL import Image
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def iter_base64(encoded):
+    """
+    Декодирует base64 кусками по CHUNK_SIZE символов. Пробелы
+    и переводы строк пропускаются, а неполная четвёрка символов
+    переносится в следующий кусок.
+    """
+    rest = ''
+    for start in range(0, len(encoded), CHUNK_SIZE):
+        data = rest + ''.join(encoded[start:start + CHUNK_SIZE].split())
+        end = len(data) - len(data) % 4
+        rest = data[end:]
+        yield binascii.a2b_base64(data[:end])
+    if rest:
+        yield binascii.a2b_base64(rest)
+
+
+def decode_base64_image(encoded, ext, max_size):
+    """
+    Декодирует base64 по частям во временный файл, одновременно
+    считая SHA-256; имя файла — хеш содержимого. Размер проверяется
+    по декодированным байтам, как только он превышает max_size.
+    """
+    digest = hashlib.sha256()
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    size = 0
+    for chunk in iter_base64(encoded):
+        size += len(chunk)
+        if size > max_size:
+            buffer.close()
+            raise ImageTooLarge
+        digest.update(chunk)
+        buffer.write(chunk)
+    buffer.seek(0)
+    return File(buffer, name=f'{digest.hexdigest()}.{ext}')
+
+
+def variant_name(name, variant, file_format):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'variants/{stem}/{variant}.{file_format}'
+
+
+def variant_key(variant, file_format):
+    return f'{variant}.{file_format}'
+
+
+def variant_urls(image, variants, request=None):
+    """
+    Адреса уменьшенных копий изображения рецепта. Копии создаются
+    в фоне и могут не появиться; для тех, которых нет в variants
+    (Recipe.image_variants), отдаётся адрес исходного изображения.
+    """
+    if not image:
+        return None
+    available = set(variants.split())
+    urls = {}
+    for variant in settings.RECIPE_IMAGE_VARIANTS:
+        urls[variant] = {}
+        for file_format in settings.RECIPE_IMAGE_FORMATS:
+            if variant_key(variant, file_format) in available:
+                url = image.storage.url(
+                    variant_name(image.name, variant, file_format)
+                )
+            else:
+                url = image.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][file_format] = url
+    return urls
+
+
+def generate_variants(storage, name):
+    """
+    Создаёт недостающие уменьшенные копии изображения; возвращает
+    ключи всех копий, которые есть в хранилище.
+    """
+    with storage.open(name) as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    keys = []
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = None
+        for file_format in settings.RECIPE_IMAGE_FORMATS:
+            keys.append(variant_key(variant, file_format))
+            target = variant_name(name, variant, file_format)
+            if storage.exists(target):
+                continue
+            if image is None:
+                image = original.copy()
+                image.thumbnail(size, Image.LANCZOS)
+            output = image
+            if file_format == 'jpeg' and output.mode != 'RGB':
+                output = output.convert('RGB')
+            buffer = BytesIO()
+            output.save(
+                buffer,
+                PIL_FORMATS[file_format],
+                quality=settings.RECIPE_IMAGE_QUALITY
+            )
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return keys
+
+
+def record_variants(name, keys):
+    """
+    Отмечает готовые копии у всех рецептов с этим изображением;
+    дата изменения обновляется, чтобы сменились ETag ответов.
+    """
+    Recipe.objects.filter(image=name).update(
+        image_variants=' '.join(keys), updated_at=timezone.now()
+    )
+
+
+def _generate_variants_safely(storage, name):
+    try:
+        with track_job('image-variants'):
+            record_variants(name, generate_variants(storage, name))
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', name)
+    finally:
+        if settings.IMAGE_PIPELINE_WORKERS:
+            connections.close_all()
+
+
+def schedule_variants(image):
+    """
+    Ставит создание копий в фоновый пул потоков;
+    при IMAGE_PIPELINE_WORKERS = 0 выполняет сразу.
+    """
+    if not image:
+        return
+    run_in_background(
+        'image-pipeline', settings.IMAGE_PIPELINE_WORKERS,
+        _generate_variants_safely, image.storage, image.name
+    )
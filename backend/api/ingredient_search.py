@@ -0,0 +1,101 @@
+from bisect import bisect_left
+
+from api.catalog import ingredients_catalog
+
+GRAM_SIZE = 3
+
+
+def iter_grams(key):
+    """
+    Все подстроки ключа длиной до GRAM_SIZE символов.
+    """
+    for size in range(1, GRAM_SIZE + 1):
+        for start in range(len(key) - size + 1):
+            yield key[start:start + size]
+
+
+class IngredientIndex:
+    """
+    Поисковый индекс ингредиентов в памяти процесса.
+
+    Ингредиенты хранятся отсортированными по названию: совпадения
+    по началу названия ищутся двоичным поиском, совпадения внутри
+    названия — пересечением списков позиций по триграммам.
+    Индекс строится из справочника ингредиентов и перестраивается
+    при смене его версии.
+    """
+
+    def __init__(self):
+        self._state = None
+
+    def build(self, catalog_items):
+        items = sorted(
+            catalog_items,
+            key=lambda item: (item['name'].lower(), item['id'])
+        )
+        keys = [item['name'].lower() for item in items]
+        grams = {}
+        for position, key in enumerate(keys):
+            for gram in set(iter_grams(key)):
+                grams.setdefault(gram, []).append(position)
+        self._state = (catalog_items, items, keys, grams)
+        return self._state
+
+    def get_state(self):
+        catalog_items = ingredients_catalog.all()
+        state = self._state
+        if state is None or state[0] is not catalog_items:
+            state = self.build(catalog_items)
+        return state[1:]
+
+    def search(self, query, limit=None):
+        """
+        Ингредиенты, название которых содержит query: сначала
+        начинающиеся с query, затем остальные; внутри групп —
+        по алфавиту.
+        """
+        items, keys, grams = self.get_state()
+        query = query.lower()
+        if not query:
+            return items[:limit]
+        results = []
+        prefix_positions = set()
+        position = bisect_left(keys, query)
+        while (
+            position < len(keys)
+            and keys[position].startswith(query)
+            and (limit is None or len(results) < limit)
+        ):
+            results.append(items[position])
+            prefix_positions.add(position)
+            position += 1
+        if limit is not None and len(results) >= limit:
+            return results
+        for position in self.find_substrings(query, keys, grams):
+            if position in prefix_positions:
+                continue
+            results.append(items[position])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def find_substrings(self, query, keys, grams):
+        if len(query) <= GRAM_SIZE:
+            return grams.get(query, ())
+        postings = sorted(
+            (grams.get(query[start:start + GRAM_SIZE], ())
+             for start in range(len(query) - GRAM_SIZE + 1)),
+            key=len
+        )
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return ()
+        return [
+            position for position in sorted(candidates)
+            if query in keys[position]
+        ]
+
+
+ingredient_index = IngredientIndex()
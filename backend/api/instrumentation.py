@@ -0,0 +1,168 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+current_stats = ContextVar('request_stats', default=None)
+
+# Метод в QUERY_BUDGETS для фоновых задач (track_job).
+JOB = 'JOB'
+
+# Функции, которые получают (имя, метод, RequestStats)
+# после каждого запроса; используются manage.py query_report.
+listeners = []
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestStats:
+    """
+    Показатели одного запроса: количество и время запросов к базе,
+    время сериализации и общее время. Время базы и сериализации
+    пересекаются: запросы часто выполняются внутри serializer.data.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.total_time = 0.0
+        self.serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        # Запросы вложенной задачи (track_job) считает только она.
+        if current_stats.get() is not self:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def collect(self):
+        token = current_stats.set(self)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.record_query)
+                    )
+                yield self
+        finally:
+            self.total_time = time.perf_counter() - started
+            current_stats.reset(token)
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'serializer;dur={self.serializer_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+def timed_data(data):
+    """
+    Оборачивает свойство data сериализатора: время считается только
+    для внешнего вызова, вложенные сериализаторы входят в него.
+    """
+    def get_data(serializer):
+        stats = current_stats.get()
+        if stats is None or stats.serializer_depth:
+            return data.fget(serializer)
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializer_depth -= 1
+    get_data.timed = True
+    return property(get_data)
+
+
+def install_serializer_timing():
+    for serializer_class in (serializers.Serializer,
+                             serializers.ListSerializer):
+        data = serializer_class.__dict__['data']
+        if not getattr(data.fget, 'timed', False):
+            serializer_class.data = timed_data(data)
+
+
+def get_endpoint_name(resolver_match):
+    return resolver_match.url_name or resolver_match.route
+
+
+def get_query_budget(name, method):
+    budgets = import_string(settings.QUERY_BUDGETS)
+    return budgets.get(name, {}).get(method)
+
+
+def check_query_budget(name, method, stats):
+    """
+    Сравнивает количество запросов с бюджетом эндпоинта; при
+    QUERY_BUDGET_RAISE превышение — исключение, иначе предупреждение
+    в лог.
+    """
+    budget = get_query_budget(name, method)
+    if budget is None or stats.queries <= budget:
+        return
+    message = (
+        f'{method} {name}: {stats.queries} запросов к базе '
+        f'при бюджете {budget}'
+    )
+    if settings.QUERY_BUDGET_RAISE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def track_job(name):
+    """
+    Считает запросы фоновой задачи отдельно от запроса, даже если
+    она выполняется в нём синхронно, и сверяет их с бюджетом
+    QUERY_BUDGETS[name]['JOB'].
+    """
+    stats = RequestStats()
+    with stats.collect():
+        yield stats
+    for listener in listeners:
+        listener(name, JOB, stats)
+    check_query_budget(name, JOB, stats)
+
+
+class InstrumentationMiddleware:
+    """
+    Считает запросы к базе и время обработки запроса, отдаёт их
+    в заголовке Server-Timing (при SERVER_TIMING) и проверяет
+    бюджет запросов эндпоинта (QUERY_BUDGETS).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_serializer_timing()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        with stats.collect():
+            response = self.get_response(request)
+        if request.resolver_match is None:
+            return response
+        name = get_endpoint_name(request.resolver_match)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = stats.server_timing()
+        for listener in listeners:
+            listener(name, request.method, stats)
+        check_query_budget(name, request.method, stats)
+        return response
@@ -0,0 +1,154 @@
+import json
+import math
+import platform
+import statistics
+from datetime import datetime
+
+from api.management.commands import query_report, seed_benchmark
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow, User
+
+
+def percentile(values, percent):
+    """
+    Перцентиль методом ближайшего ранга.
+    """
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+class Command(query_report.Command):
+    help = ('Нагрузочный прогон API: для каждого объёма данных создаёт '
+            'синтетические данные (seed_benchmark), выполняет запросы '
+            'ко всем эндпоинтам и сохраняет p50/p95/p99 времени ответа '
+            'и количество запросов к базе в JSON; с --compare печатает '
+            'изменения относительно прошлого прогона.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='1000,10000',
+            help='Количество рецептов для каждого прогона через запятую.'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', default=None)
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales: ожидаются целые числа')
+        results = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'repeat': options['repeat'],
+            'scales': {},
+        }
+        for scale in scales:
+            self.stdout.write(f'Объём {scale} рецептов: создание данных...')
+            seed_benchmark.clear()
+            with transaction.atomic():
+                seed_benchmark.generate(scale, seed=options['seed'])
+            try:
+                with self.instrumented():
+                    self.run_steps(*self.seed(), options['repeat'])
+            finally:
+                self.cleanup()
+            results['scales'][str(scale)] = self.summarize()
+        seed_benchmark.clear()
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.report_results(results)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.compare(json.load(file), results)
+        self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def seed(self):
+        """
+        Участники сценария из данных seed_benchmark: зритель,
+        три автора с рецептами и 30 чужих рецептов.
+        """
+        users = User.objects.filter(
+            username__startswith=seed_benchmark.PREFIX
+        )
+        authors = list(users.order_by('-recipes_count')[:3])
+        viewer = users.exclude(
+            pk__in=[author.pk for author in authors]
+        ).order_by('-followers_count').first()
+        recipes = list(authors[0].recipes.order_by('-id')[:30])
+        if len(recipes) < 30:
+            raise CommandError('Слишком мало данных: увеличьте --scales')
+        tags = list(recipes[0].tags.all()) + list(recipes[1].tags.all())
+        ingredients = [
+            quantity.ingredient
+            for quantity in recipes[0].ingredients_quantities.select_related(
+                'ingredient'
+            )
+        ]
+        # Шаги сценария начинают с добавления recipes[1] в избранное,
+        # удаления recipes[0] из списка покупок и отписки от автора.
+        Favorite.objects.filter(user=viewer, recipe=recipes[1]).delete()
+        ShoppingCart.objects.get_or_create(user=viewer, recipe=recipes[0])
+        Follow.objects.get_or_create(user=viewer, author=authors[0])
+        viewer.set_password(seed_benchmark.PASSWORD)
+        viewer.save()
+        return [viewer, *authors], tags, ingredients, recipes
+
+    def summarize(self):
+        summary = {}
+        for (name, method), runs in sorted(self.stats.items()):
+            timings = [stats.total_time * 1000 for stats in runs]
+            queries = [stats.queries for stats in runs]
+            summary[f'{method} {name}'] = {
+                'requests': len(runs),
+                'p50_ms': round(percentile(timings, 50), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+                'queries_mean': round(statistics.mean(queries), 2),
+                'queries_max': max(queries),
+            }
+        return summary
+
+    def report_results(self, results):
+        for scale, summary in results['scales'].items():
+            self.stdout.write(f'\nОбъём {scale} рецептов')
+            self.stdout.write(
+                f'{"эндпоинт":<34}{"p50, мс":>9}{"p95, мс":>9}'
+                f'{"p99, мс":>9}{"запросов":>10}'
+            )
+            for endpoint, row in summary.items():
+                self.stdout.write(
+                    f'{endpoint:<34}{row["p50_ms"]:>9.1f}'
+                    f'{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}'
+                    f'{row["queries_mean"]:>10.1f}'
+                )
+
+    def compare(self, previous, current):
+        self.stdout.write(
+            f'\nСравнение с прогоном {previous["created"]} '
+            '(p95 и среднее количество запросов)'
+        )
+        for scale, summary in current['scales'].items():
+            before = previous['scales'].get(scale)
+            if before is None:
+                continue
+            self.stdout.write(f'Объём {scale} рецептов')
+            for endpoint, row in summary.items():
+                old = before.get(endpoint)
+                if old is None:
+                    continue
+                change = (
+                    (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+                    if old['p95_ms'] else 0
+                )
+                self.stdout.write(
+                    f'{endpoint:<34}{old["p95_ms"]:>9.1f} → '
+                    f'{row["p95_ms"]:<9.1f}{change:>+7.0f}%'
+                    f'{old["queries_mean"]:>8.1f} → {row["queries_mean"]:.1f}'
+                )
@@ -0,0 +1,96 @@
+import resource
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+from api.pdf import FONT_NAME, FONT_PATH, render_shopping_list_pdf
+from api.shopping_list import format_line
+from django.core.management.base import BaseCommand
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+
+def legacy_render(shopping_list):
+    """
+    Прежняя реализация из DownloadShoppingCartAPIView: шрифт
+    регистрируется в каждом запросе, все строки на одной странице.
+    """
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH, 'UTF-8'))
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer)
+    page.setFont(FONT_NAME, 14)
+    page.drawString(250, 800, 'Список покупок:')
+    height = 750
+    for number, item in enumerate(shopping_list, 1):
+        page.drawString(75, height, format_line(number, item))
+        height -= 25
+    page.showPage()
+    page.save()
+    return buffer.getvalue()
+
+
+def make_shopping_list(size):
+    return [
+        {
+            'ingredient__name': f'ингредиент {number}',
+            'ingredient__measurement_unit': 'г',
+            'total_amount': number * 10,
+        }
+        for number in range(size)
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время и потребление памяти при формировании '
+            'PDF со списком покупок прежним и новым способом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Количество строк в списке покупок.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество прогонов для каждого размера.'
+        )
+
+    def measure(self, render, shopping_list, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            document = render(shopping_list)
+            timings.append(time.perf_counter() - started)
+        tracemalloc.start()
+        render(shopping_list)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return timings, peak, len(document)
+
+    def handle(self, *args, **options):
+        renderers = (
+            ('прежний', legacy_render),
+            ('новый', render_shopping_list_pdf),
+        )
+        self.stdout.write(
+            f'{"строк":>6} {"вариант":>9} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"пик, КиБ":>10} {"размер, КиБ":>12}'
+        )
+        for size in options['sizes']:
+            shopping_list = make_shopping_list(size)
+            for name, render in renderers:
+                timings, peak, length = self.measure(
+                    render, shopping_list, options['repeat']
+                )
+                timings.sort()
+                p95 = timings[min(len(timings) - 1,
+                                  int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f'{size:>6} {name:>9} '
+                    f'{statistics.median(timings) * 1000:>9.2f} '
+                    f'{p95 * 1000:>9.2f} {peak / 1024:>10.0f} '
+                    f'{length / 1024:>12.0f}'
+                )
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(f'Пиковый RSS процесса: {max_rss} КиБ')
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+from api.similarity import (INGREDIENT, TAG, count_pairs, encode,
+                            feature_keys, iter_neighbours, load_features,
+                            rebuild)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+
+def zipf_probabilities(count, exponent=1.1):
+    weights = 1 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def synthetic_features(recipes, ingredients, tags, rng):
+    """
+    Пары (рецепт, признак) с тем же распределением, что у
+    seed_benchmark: 3–12 ингредиентов и 1–4 тега на рецепт,
+    популярность признаков — по Ципфу.
+    """
+    columns = []
+    rows = []
+    for kind, count, low, high in ((INGREDIENT, ingredients, 3, 12),
+                                   (TAG, tags, 1, 4)):
+        sizes = rng.integers(low, high + 1, recipes)
+        rows.append(np.repeat(np.arange(1, recipes + 1), sizes))
+        columns.append(feature_keys(rng.choice(
+            np.arange(1, count + 1), size=sizes.sum(),
+            p=zipf_probabilities(count)
+        ), kind))
+    return np.concatenate(rows), np.concatenate(columns)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет перестройку похожих рецептов (api.similarity). '
+            'По умолчанию — только вычисления на синтетических данных '
+            'в памяти: кодирование векторов и поиск соседей пакетами, '
+            'без чтения признаков из базы и записи соседей. С --database '
+            '— rebuild() целиком на данных текущей базы (например, после '
+            'seed_benchmark); таблица SimilarRecipe перезаписывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10000,100000,1000000')
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--max-df', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--database', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales: ожидаются целые числа')
+        max_df = options['max_df'] or settings.SIMILAR_RECIPES_MAX_DF
+        batch_size = (
+            options['batch_size'] or settings.SIMILAR_RECIPES_BATCH_SIZE
+        )
+        with override_settings(SIMILAR_RECIPES_MAX_DF=max_df):
+            if options['database']:
+                self.run_database(batch_size)
+                return
+            self.stdout.write(
+                'Только вычисления, без чтения и записи в базу:\n'
+                f'{"рецептов":>9}{"пар":>11}{"в матрице":>11}'
+                f'{"векторы, с":>12}{"соседи, с":>11}{"соседей":>9}'
+            )
+            for scale in scales:
+                self.run(scale, batch_size, options)
+
+    def run_database(self, batch_size):
+        """
+        rebuild() целиком: чтение признаков, вычисления и запись
+        соседей. Чтение признаков отдельно замеряется заранее,
+        чтобы показать его долю.
+        """
+        started = time.perf_counter()
+        recipes, _ = load_features()
+        loaded = time.perf_counter()
+        count, written = rebuild(batch_size)
+        finished = time.perf_counter()
+        self.stdout.write(
+            f'{"рецептов":>9}{"пар":>11}{"чтение, с":>11}'
+            f'{"rebuild(), с":>14}{"соседей":>9}'
+        )
+        self.stdout.write(
+            f'{count:>9}{len(recipes):>11}{loaded - started:>11.2f}'
+            f'{finished - loaded:>14.2f}{written / max(count, 1):>9.1f}'
+        )
+
+    def run(self, scale, batch_size, options):
+        rng = np.random.default_rng(options['seed'])
+        recipes, keys = synthetic_features(
+            scale, options['ingredients'], options['tags'], rng
+        )
+        started = time.perf_counter()
+        recipe_ids, matrix = encode(
+            recipes, keys, count_pairs(recipes, keys), scale
+        )
+        encoded = time.perf_counter()
+        neighbours = 0
+        for batch in iter_neighbours(
+            recipe_ids, matrix, settings.SIMILAR_RECIPES_COUNT, batch_size
+        ):
+            neighbours += len(batch[0])
+        finished = time.perf_counter()
+        self.stdout.write(
+            f'{scale:>9}{len(recipes):>11}{matrix.nnz:>11}'
+            f'{encoded - started:>12.2f}{finished - encoded:>11.2f}'
+            f'{neighbours / scale:>9.1f}'
+        )
@@ -0,0 +1,108 @@
+import random
+import statistics
+import time
+
+from api.catalog import tags_catalog
+from api.filters import RecipeFilter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe, Tag
+from users.models import User
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает фильтрацию рецептов по нескольким тегам через JOIN '
+            'и через RecipeFilter на синтетических данных; данные создаются '
+            'в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            tags_catalog.invalidate()
+
+    def seed(self, recipes_count, tags_count):
+        author = User.objects.create(
+            username='benchmark-author', email='benchmark@example.com'
+        )
+        slugs = [f'benchmark-{number}' for number in range(tags_count)]
+        Tag.objects.bulk_create(
+            Tag(name=slug, slug=slug, color=f'#be{number:04x}')
+            for number, slug in enumerate(slugs)
+        )
+        tag_ids = list(Tag.objects.filter(
+            slug__in=slugs
+        ).values_list('id', flat=True))
+        through = Recipe.tags.through
+        for start in range(0, recipes_count, BATCH_SIZE):
+            size = min(BATCH_SIZE, recipes_count - start)
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'benchmark {start + number}',
+                       text='benchmark', image='benchmark.png')
+                for number in range(size)
+            )
+        recipe_ids = Recipe.objects.filter(
+            author=author
+        ).values_list('id', flat=True)
+        links = []
+        for recipe_id in recipe_ids.iterator():
+            for tag_id in random.sample(tag_ids, random.randint(3, 5)):
+                links.append(through(recipe_id=recipe_id, tag_id=tag_id))
+            if len(links) >= BATCH_SIZE:
+                through.objects.bulk_create(links)
+                links = []
+        through.objects.bulk_create(links)
+        # bulk_create не отправляет сигналы; транзакция будет
+        # откачена, поэтому справочник сбрасывается сразу.
+        tags_catalog.reset()
+        return slugs
+
+    def measure(self, make_queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = make_queryset()
+            count = queryset.count()
+            list(queryset.values_list('id', flat=True)[:6])
+            timings.append(time.perf_counter() - started)
+        ids = list(make_queryset().values_list('id', flat=True))
+        return statistics.median(timings), count, len(ids) - len(set(ids))
+
+    def run(self, options):
+        self.stdout.write('Создание данных...')
+        slugs = self.seed(options['recipes'], options['tags'])
+        selected = slugs[:3]
+        variants = (
+            ('JOIN', lambda: Recipe.objects.filter(tags__slug__in=selected)),
+            ('JOIN + DISTINCT', lambda: Recipe.objects.filter(
+                tags__slug__in=selected
+            ).distinct()),
+            ('RecipeFilter', lambda: RecipeFilter(
+                {'tags': selected}, queryset=Recipe.objects.all()
+            ).qs),
+        )
+        self.stdout.write(
+            f'{"вариант":>16} {"медиана, мс":>12} {"строк":>8} '
+            f'{"дубликатов":>11}'
+        )
+        for name, make_queryset in variants:
+            median, count, duplicates = self.measure(
+                make_queryset, options['repeat']
+            )
+            self.stdout.write(
+                f'{name:>16} {median * 1000:>12.1f} {count:>8} '
+                f'{duplicates:>11}'
+            )
@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from api.authentication import CachedTokenAuthentication, token_cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает TokenAuthentication и CachedTokenAuthentication: '
+            'время и количество запросов к базе на один запрос к API; '
+            'пользователь создаётся в транзакции и откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def measure(self, authentication, request, count):
+        # Запросы считаются отдельным проходом: запись запросов
+        # замедляет курсор и исказила бы время.
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(count):
+                authentication.authenticate(request)
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            authentication.authenticate(request)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), len(queries) / count
+
+    def run(self, options):
+        user = User.objects.create(
+            username='benchmark-user', email='benchmark@example.com'
+        )
+        token = Token.objects.create(user=user)
+        request = APIRequestFactory().get(
+            '/api/recipes/', HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        token_cache.invalidate([token.key])
+        variants = (
+            ('TokenAuthentication', TokenAuthentication()),
+            ('CachedTokenAuthentication', CachedTokenAuthentication()),
+        )
+        self.stdout.write(
+            f'{"вариант":>26} {"медиана, мкс":>13} {"запросов":>9}'
+        )
+        for name, authentication in variants:
+            median, queries = self.measure(
+                authentication, request, options['requests']
+            )
+            self.stdout.write(
+                f'{name:>26} {median * 1_000_000:>13.1f} {queries:>9.3f}'
+            )
+        token_cache.invalidate([token.key])
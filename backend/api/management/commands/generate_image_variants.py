@@ -0,0 +1,27 @@
+from api.images import generate_variants, record_variants
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие уменьшенные копии изображений рецептов, '
+            'например для рецептов, загруженных до их появления, '
+            'и отмечает их у рецептов (Recipe.image_variants).')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        names = Recipe.objects.exclude(image='').order_by(
+            'image'
+        ).values_list('image', flat=True).distinct()
+        processed = failed = 0
+        for name in names.iterator():
+            try:
+                record_variants(name, generate_variants(storage, name))
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,287 @@
+import base64
+import statistics
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+
+from api import instrumentation
+from api.catalog import ingredients_catalog, tags_catalog
+from api.pantry import pantry_index
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                            ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+PASSWORD = 'Tomato-basil-2024'
+PREFIX = 'query-report-'
+
+
+def make_image():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), 'orange').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    help = ('Выполняет запросы ко всем эндпоинтам API на синтетических '
+            'данных и печатает по каждому количество запросов к базе, '
+            'время базы, сериализации и общее время в сравнении '
+            'с бюджетом из QUERY_BUDGETS. Данные создаются в базе '
+            'и удаляются после прогона, версии справочников в общем '
+            'кеше сбрасываются: не запускайте на рабочей базе. '
+            'С --check завершается ошибкой при превышении бюджета.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--check', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            with self.instrumented():
+                self.run_steps(*self.seed(), options['repeat'])
+        finally:
+            self.cleanup()
+        problems = self.report()
+        if problems and options['check']:
+            raise CommandError('\n'.join(problems))
+
+    @contextmanager
+    def instrumented(self):
+        """
+        Собирает показатели запросов в self.stats. Выполняется
+        без общей транзакции: иначе каждый atomic() во вьюхах
+        превратится в SAVEPOINT и исказит количество запросов.
+        """
+        self.stats = {}
+        instrumentation.listeners.append(self.record)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    MEDIA_ROOT=media_root,
+                    IMAGE_PIPELINE_WORKERS=0,
+                    SIMILAR_RECIPES_WORKERS=0,
+                    QUERY_BUDGET_RAISE=False
+                ):
+                    yield
+        finally:
+            instrumentation.listeners.remove(self.record)
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=PREFIX).delete()
+        Tag.objects.filter(slug__startswith=PREFIX).delete()
+        Ingredient.objects.filter(name__startswith=PREFIX).delete()
+
+    def record(self, name, method, stats):
+        self.stats.setdefault((name, method), []).append(stats)
+
+    def seed(self):
+        users = [
+            User.objects.create_user(
+                username=f'{PREFIX}{number}',
+                email=f'{PREFIX}{number}@example.com',
+                password=PASSWORD,
+                first_name='Query',
+                last_name='Report',
+            )
+            for number in range(4)
+        ]
+        Tag.objects.bulk_create(
+            Tag(name=f'{PREFIX}{number}', slug=f'{PREFIX}{number}',
+                color=f'#ce{number:04x}')
+            for number in range(6)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{PREFIX}{number}', measurement_unit='г')
+            for number in range(50)
+        )
+        tags = list(Tag.objects.filter(slug__startswith=PREFIX))
+        ingredients = list(
+            Ingredient.objects.filter(name__startswith=PREFIX)
+        )
+        for author in users[1:]:
+            for number in range(10):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'query-report {number}',
+                    text='query report', image='query-report.png'
+                )
+                recipe.tags.set(tags[number % 3:number % 3 + 3])
+                IngredientQuantity.objects.bulk_create(
+                    IngredientQuantity(
+                        recipe=recipe, ingredient=ingredient, amount=number + 1
+                    )
+                    for ingredient in ingredients[number:number + 5]
+                )
+            Follow.objects.create(user=users[0], author=author)
+        recipes = list(Recipe.objects.filter(author__in=users[1:]))
+        Favorite.objects.bulk_create(
+            Favorite(user=users[0], recipe=recipe) for recipe in recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=users[0], recipe=recipe)
+            for recipe in recipes[::3]
+        )
+        tags_catalog.invalidate()
+        ingredients_catalog.invalidate()
+        pantry_index.invalidate()
+        return users, tags, ingredients, recipes
+
+    def get_steps(self, users, tags, ingredients, recipes):
+        """
+        Шаги одного прохода: (метод, имя URL, аргументы URL,
+        данные, авторизован ли клиент). Добавления чередуются
+        с удалениями, чтобы проходы были одинаковыми.
+        """
+        author = users[1]
+        recipe = recipes[1]
+        liked = recipes[0]
+        recipe_data = {
+            'tags': [tag.pk for tag in tags[:2]],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in ingredients[:5]
+            ],
+            'name': 'query report',
+            'text': 'query report',
+            'cooking_time': 10,
+        }
+        batch = {'ids': [recipe.pk for recipe in recipes[5:25]]}
+        pantry = {
+            'ingredients': [ingredient.pk for ingredient in ingredients[:8]]
+        }
+        return (
+            ('GET', 'api-root', {}, None, False),
+            ('GET', 'tags-list', {}, None, False),
+            ('GET', 'tags-detail', {'pk': tags[0].pk}, None, False),
+            ('GET', 'ingredients-list', {},
+             {'name': ingredients[0].name[:3]}, False),
+            ('GET', 'ingredients-detail', {'pk': ingredients[0].pk},
+             None, False),
+            ('GET', 'recipies-list', {}, None, False),
+            ('GET', 'recipies-list', {}, None, True),
+            ('GET', 'recipies-list', {},
+             {'tags': [tag.slug for tag in tags[:2]], 'is_favorited': 1},
+             True),
+            ('GET', 'recipies-list', {},
+             {'search': liked.name.split()[0],
+              'tags': [tag.slug for tag in tags[:3]]}, False),
+            ('GET', 'recipies-detail', {'pk': recipe.pk}, None, False),
+            ('GET', 'recipies-detail', {'pk': recipe.pk}, None, True),
+            ('GET', 'recipies-feed', {}, None, True),
+            ('GET', 'recipies-cook', {}, pantry, True),
+            ('POST', 'recipies-list', {},
+             dict(recipe_data, image=make_image()), True),
+            ('PATCH', 'recipies-detail', {'pk': 'created'},
+             dict(recipe_data, ingredients=recipe_data['ingredients'][2:]),
+             True),
+            ('GET', 'recipies-similar', {'pk': 'created'}, None, False),
+            ('DELETE', 'recipies-detail', {'pk': 'created'}, None, True),
+            ('POST', 'favorite', {'id': recipe.pk}, None, True),
+            ('DELETE', 'favorite', {'id': recipe.pk}, None, True),
+            ('DELETE', 'shopping-cart', {'id': liked.pk}, None, True),
+            ('POST', 'shopping-cart', {'id': liked.pk}, None, True),
+            ('POST', 'favorite-batch', {}, batch, True),
+            ('DELETE', 'favorite-batch', {}, batch, True),
+            ('POST', 'shopping-cart-batch', {}, batch, True),
+            ('DELETE', 'shopping-cart-batch', {}, batch, True),
+            ('GET', 'download-shopping-cart', {}, {'format': 'txt'}, True),
+            ('GET', 'download-shopping-cart', {}, None, True),
+            ('GET', 'subscriptions', {}, None, True),
+            ('DELETE', 'subscribe', {'id': author.pk}, None, True),
+            ('POST', 'subscribe', {'id': author.pk}, None, True),
+            ('DELETE', 'subscribe-batch', {},
+             {'ids': [users[2].pk, users[3].pk]}, True),
+            ('POST', 'subscribe-batch', {},
+             {'ids': [users[2].pk, users[3].pk]}, True),
+            ('GET', 'users-list', {}, None, False),
+            ('GET', 'users-list', {}, None, True),
+            ('GET', 'users-detail', {'id': author.pk}, None, True),
+            ('GET', 'users-me', {}, None, True),
+            ('POST', 'users-set-password', {},
+             {'current_password': PASSWORD, 'new_password': PASSWORD},
+             True),
+            ('POST', 'users-list', {}, 'new-user', False),
+            ('POST', 'login', {},
+             {'email': users[3].email, 'password': PASSWORD}, False),
+            ('POST', 'logout', {}, None, 'login'),
+        )
+
+    def run_steps(self, users, tags, ingredients, recipes, repeat):
+        token, _ = Token.objects.get_or_create(user=users[0])
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        steps = self.get_steps(users, tags, ingredients, recipes)
+        state = {}
+        for iteration in range(repeat):
+            for method, name, kwargs, data, auth in steps:
+                kwargs = {
+                    key: state[value] if value in state else value
+                    for key, value in kwargs.items()
+                }
+                if data == 'new-user':
+                    data = {
+                        'username': f'{PREFIX}new-{iteration}',
+                        'email': f'{PREFIX}new-{iteration}@example.com',
+                        'first_name': 'Query',
+                        'last_name': 'Report',
+                        'password': PASSWORD,
+                    }
+                if auth == 'login':
+                    client = APIClient()
+                    client.credentials(
+                        HTTP_AUTHORIZATION=f'Token {state["login"]}'
+                    )
+                else:
+                    client = clients[auth]
+                handler = getattr(client, method.lower())
+                response = handler(
+                    reverse(name, kwargs=kwargs),
+                    data,
+                    format=None if method == 'GET' else 'json'
+                )
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{method} {name}: {response.status_code} '
+                        f'{getattr(response, "data", "")}'
+                    )
+                if name == 'recipies-list' and method == 'POST':
+                    state['created'] = response.data['id']
+                if name == 'login':
+                    state['login'] = response.data['auth_token']
+
+    def report(self):
+        self.stdout.write(
+            f'{"метод":<7}{"эндпоинт":<26}{"запросов":>9}{"бюджет":>8}'
+            f'{"база, мс":>10}{"сериал., мс":>12}{"всего, мс":>11}'
+        )
+        problems = []
+        for (name, method), runs in sorted(self.stats.items()):
+            queries = max(stats.queries for stats in runs)
+            budget = instrumentation.get_query_budget(name, method)
+            if budget is None:
+                problems.append(f'{method} {name}: бюджет не задан')
+            elif queries > budget:
+                problems.append(
+                    f'{method} {name}: {queries} запросов '
+                    f'при бюджете {budget}'
+                )
+            db_time, serializer_time, total_time = (
+                statistics.median(
+                    getattr(stats, field) for stats in runs
+                ) * 1000
+                for field in ('db_time', 'serializer_time', 'total_time')
+            )
+            self.stdout.write(
+                f'{method:<7}{name:<26}{queries:>9}'
+                f'{"—" if budget is None else budget:>8}'
+                f'{db_time:>10.1f}{serializer_time:>12.1f}'
+                f'{total_time:>11.1f}'
+            )
+        for problem in problems:
+            self.stderr.write(problem)
+        return problems
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from api.pantry import pantry_index
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+from recipes.models import IngredientQuantity, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает индекс подбора рецептов по ингредиентам '
+            '(api.pantry): меняет версию индекса, чтобы все воркеры '
+            'построили его заново, строит его в этом процессе и печатает '
+            'размер и время. С --queries сравнивает ответы и время '
+            'индекса с запросом к recipes_ingredientquantity '
+            'на случайных наборах ингредиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=0)
+        parser.add_argument('--ingredients', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        pantry_index.invalidate()
+        started = time.perf_counter()
+        state = pantry_index.get_state()
+        elapsed = time.perf_counter() - started
+        recipe_ids, _ = state.recipes
+        self.stdout.write(
+            f'Рецептов: {len(recipe_ids)}, ингредиентов: '
+            f'{len(state.postings)}, пар: {len(state.flat)}'
+        )
+        self.stdout.write(
+            f'Построен за {elapsed:.2f} с, '
+            f'{state.memory_size() / 2 ** 20:.1f} МиБ'
+        )
+        if options['queries']:
+            self.compare(options)
+
+    def query_database(self, ingredient_ids):
+        """
+        Тот же подбор соединением с recipes_ingredientquantity.
+        """
+        rows = Recipe.objects.annotate(
+            matched=Count(
+                'ingredients_quantities__ingredient',
+                filter=Q(ingredients_quantities__ingredient__in=(
+                    ingredient_ids
+                )),
+                distinct=True,
+            ),
+            size=Count('ingredients_quantities__ingredient', distinct=True),
+        ).filter(matched__gt=0).order_by().values_list(
+            'id', 'matched', 'size'
+        )
+        return [
+            (pk, matched, size - matched) for pk, matched, size in rows
+        ]
+
+    def compare(self, options):
+        rng = random.Random(options['seed'])
+        ingredient_ids = list(IngredientQuantity.objects.values_list(
+            'ingredient_id', flat=True
+        ).distinct())
+        index_timings, database_timings = [], []
+        for _ in range(options['queries']):
+            pantry = rng.sample(ingredient_ids, min(
+                options['ingredients'], len(ingredient_ids)
+            ))
+            started = time.perf_counter()
+            found = list(zip(*(
+                array.tolist() for array in pantry_index.coverage(pantry)
+            )))
+            index_timings.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            expected = self.query_database(pantry)
+            database_timings.append(time.perf_counter() - started)
+            if sorted(found) != sorted(expected):
+                self.stderr.write(
+                    f'Расхождение для ингредиентов {sorted(pantry)}'
+                )
+        self.stdout.write(
+            f'Медиана: индекс '
+            f'{statistics.median(index_timings) * 1000:.2f} мс, '
+            f'база {statistics.median(database_timings) * 1000:.2f} мс'
+        )
@@ -0,0 +1,25 @@
+import time
+
+from api.similarity import rebuild
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты (api.similarity) для всех '
+            'рецептов и перезаписывает таблицу SimilarRecipe. Нужна '
+            'после массовых изменений в обход API: загрузки данных, '
+            'правок в админке; изменения через API пересчитываются сами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Строк в пакете, по умолчанию SIMILAR_RECIPES_BATCH_SIZE.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes, written = rebuild(options['batch_size'])
+        self.stdout.write(
+            f'Рецептов: {recipes}, пар: {written}, '
+            f'за {time.perf_counter() - started:.1f} с.'
+        )
@@ -0,0 +1,15 @@
+from api.counters import recount
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, списков покупок, '
+            'рецептов и подписчиков по связанным таблицам.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: исправлено строк — {rows}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
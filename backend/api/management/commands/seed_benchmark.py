@@ -0,0 +1,274 @@
+import random
+import time
+from itertools import accumulate
+
+from api.authentication import token_cache
+from api.catalog import ingredients_catalog, tags_catalog
+from api.counters import recount
+from api.pantry import pantry_index
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from faker import Faker
+from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                            ShoppingCart, SimilarRecipe, Tag)
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+PREFIX = 'bench-'
+PASSWORD = 'Tomato-basil-2024'
+BATCH_SIZE = 5000
+VOCABULARY_SIZE = 500
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Накопленные веса распределения Ципфа: несколько популярных
+    элементов и длинный хвост.
+    """
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def pick_unique(population, cum_weights, count, rng):
+    """
+    До count различных элементов с учётом весов.
+    """
+    count = min(count, len(population))
+    chosen = set()
+    for _ in range(count * 3):
+        if len(chosen) >= count:
+            break
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=count - len(chosen)
+        ))
+    return chosen
+
+
+def insert(model, objects):
+    for start in range(0, len(objects), BATCH_SIZE):
+        model.objects.bulk_create(objects[start:start + BATCH_SIZE])
+
+
+def delete_rows(queryset):
+    """
+    DELETE по подзапросу: без выборки объектов, каскадов и сигналов.
+    """
+    model = queryset.model
+    sql, params = queryset.values('pk').query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} IN ({sql})',
+            params
+        )
+
+
+def clear():
+    """
+    Удаляет данные, созданные generate(). Удаление идёт по таблицам
+    без выборки объектов и без сигналов, поэтому кеши токенов
+    и справочников сбрасываются явно.
+    """
+    users = User.objects.filter(username__startswith=PREFIX)
+    recipes = Recipe.objects.filter(author__in=users)
+    deletions = (
+        Favorite.objects.filter(user__in=users),
+        Favorite.objects.filter(recipe__in=recipes),
+        ShoppingCart.objects.filter(user__in=users),
+        ShoppingCart.objects.filter(recipe__in=recipes),
+        Follow.objects.filter(user__in=users),
+        Follow.objects.filter(author__in=users),
+        IngredientQuantity.objects.filter(recipe__in=recipes),
+        SimilarRecipe.objects.filter(recipe__in=recipes),
+        SimilarRecipe.objects.filter(similar__in=recipes),
+        Recipe.tags.through.objects.filter(recipe__in=recipes),
+        recipes,
+        Token.objects.filter(user__in=users),
+        users,
+        Tag.objects.filter(slug__startswith=PREFIX),
+        Ingredient.objects.filter(name__startswith=PREFIX),
+    )
+    token_cache.invalidate(
+        Token.objects.filter(user__in=users).values_list('key', flat=True)
+    )
+    with transaction.atomic():
+        for queryset in deletions:
+            delete_rows(queryset)
+    tags_catalog.invalidate()
+    ingredients_catalog.invalidate()
+    pantry_index.invalidate()
+
+
+def generate(recipes, users=None, tags=20, ingredients=2000,
+             favorites=12, carts=4, follows=8, seed=0):
+    """
+    Создаёт синтетические данные: количество рецептов у авторов,
+    популярность рецептов, тегов, ингредиентов и авторов
+    распределены по Ципфу; favorites, carts и follows — среднее
+    количество связей на пользователя. Возвращает количество
+    созданных строк по моделям.
+    """
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    words = [fake.word() for _ in range(VOCABULARY_SIZE)]
+    users = users or max(recipes // 5, 10)
+    created = {}
+
+    password = make_password(PASSWORD)
+    insert(User, [
+        User(
+            username=f'{PREFIX}{number}',
+            email=f'{PREFIX}{number}@example.com',
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+            password=password,
+        )
+        for number in range(users)
+    ])
+    user_ids = list(User.objects.filter(
+        username__startswith=PREFIX
+    ).order_by('id').values_list('id', flat=True))
+    rng.shuffle(user_ids)
+    user_weights = zipf_weights(len(user_ids))
+    created['users'] = len(user_ids)
+
+    insert(Tag, [
+        Tag(name=f'{PREFIX}{number}', slug=f'{PREFIX}{number}',
+            color=f'#b{number:05x}')
+        for number in range(tags)
+    ])
+    tag_ids = list(Tag.objects.filter(
+        slug__startswith=PREFIX
+    ).values_list('id', flat=True))
+    tag_weights = zipf_weights(len(tag_ids))
+    created['tags'] = len(tag_ids)
+
+    units = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+    insert(Ingredient, [
+        Ingredient(
+            name=f'{PREFIX}{rng.choice(words)} {number}',
+            measurement_unit=rng.choice(units)
+        )
+        for number in range(ingredients)
+    ])
+    ingredient_ids = list(Ingredient.objects.filter(
+        name__startswith=PREFIX
+    ).values_list('id', flat=True))
+    rng.shuffle(ingredient_ids)
+    ingredient_weights = zipf_weights(len(ingredient_ids))
+    created['ingredients'] = len(ingredient_ids)
+
+    authors = rng.choices(user_ids, cum_weights=user_weights, k=recipes)
+    insert(Recipe, [
+        Recipe(
+            author_id=author_id,
+            name=' '.join(rng.sample(words, 3)).capitalize(),
+            text=' '.join(rng.choices(words, k=40)),
+            image='bench.png',
+            cooking_time=rng.randint(5, 180),
+        )
+        for author_id in authors
+    ])
+    recipe_ids = list(Recipe.objects.filter(
+        author__username__startswith=PREFIX
+    ).values_list('id', flat=True))
+    rng.shuffle(recipe_ids)
+    recipe_weights = zipf_weights(len(recipe_ids))
+    created['recipes'] = len(recipe_ids)
+
+    through = Recipe.tags.through
+    links, quantities = [], []
+    for recipe_id in recipe_ids:
+        for tag_id in pick_unique(
+            tag_ids, tag_weights, rng.randint(1, 4), rng
+        ):
+            links.append(through(recipe_id=recipe_id, tag_id=tag_id))
+        for ingredient_id in pick_unique(
+            ingredient_ids, ingredient_weights, rng.randint(3, 12), rng
+        ):
+            quantities.append(IngredientQuantity(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500)
+            ))
+    insert(through, links)
+    insert(IngredientQuantity, quantities)
+    created['recipe tags'] = len(links)
+    created['ingredient quantities'] = len(quantities)
+
+    relations = (
+        ('favorites', Favorite, 'recipe_id', recipe_ids, recipe_weights,
+         favorites),
+        ('shopping carts', ShoppingCart, 'recipe_id', recipe_ids,
+         recipe_weights, carts),
+        ('follows', Follow, 'author_id', user_ids, user_weights, follows),
+    )
+    for name, model, field, targets, weights, mean in relations:
+        objects = []
+        for user_id in user_ids:
+            count = int(rng.expovariate(1 / mean)) if mean else 0
+            for target_id in pick_unique(targets, weights, count, rng):
+                if target_id != user_id:
+                    objects.append(
+                        model(user_id=user_id, **{field: target_id})
+                    )
+        insert(model, objects)
+        created[name] = len(objects)
+
+    # bulk_create не обновляет счётчики и не отправляет сигналы.
+    recount()
+    tags_catalog.invalidate()
+    ingredients_catalog.invalidate()
+    pantry_index.invalidate()
+    return created
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетические данные для нагрузочного тестирования: '
+            'пользователей, рецепты, теги, ингредиенты, избранное, '
+            'списки покупок и подписки с неравномерной популярностью. '
+            f'Все пользователи получают пароль {PASSWORD}.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument(
+            '--users', type=int, default=None,
+            help='По умолчанию — по пять рецептов на пользователя.'
+        )
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--favorites', type=int, default=12)
+        parser.add_argument('--carts', type=int, default=4)
+        parser.add_argument('--follows', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданные данные и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        clear()
+        if options['clear']:
+            self.stdout.write('Данные удалены.')
+            return
+        with transaction.atomic():
+            created = generate(
+                options['recipes'],
+                users=options['users'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                follows=options['follows'],
+                seed=options['seed'],
+            )
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - started:.1f} с.'
+        )
@@ -0,0 +1,66 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+MAX_PAGE_SIZE = 100
+
+
+class ModelOrderingCursorPagination(CursorPagination):
+    """
+    Пагинация по непрозрачному курсору поверх сортировки модели
+    (Meta.ordering по id): следующая страница выбирается условием
+    по id, без OFFSET и без подсчёта общего количества.
+    """
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return queryset.model._meta.ordering or self.ordering
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с размером страницы из параметра limit;
+    подходит и для списков, упорядоченных вне базы.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class PageNumberOrCursorPagination(LimitPageNumberPagination):
+    """
+    Постраничная пагинация по умолчанию; с параметром cursor
+    (в том числе пустым — первая страница) — пагинация по курсору.
+    Курсор возможен только при сортировке модели: для выборки
+    с другой сортировкой (поиск по релевантности) cursor
+    игнорируется, и ответ разбит на страницы по номеру.
+    """
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = ModelOrderingCursorPagination
+
+    def has_model_ordering(self, queryset):
+        ordering = queryset.query.order_by
+        return not ordering or tuple(ordering) == tuple(
+            queryset.model._meta.ordering
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param in request.query_params
+            and self.has_model_ordering(queryset)
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
@@ -0,0 +1,237 @@
+import threading
+from itertools import chain
+
+import numpy as np
+from api.versions import VersionedState
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from recipes.models import IngredientQuantity
+
+VERSION_KEY = 'pantry:version'
+CHANGES_KEY = 'pantry:{version}:changes'
+CHANGE_KEY = 'pantry:{version}:change:{number}'
+CHANGE_TTL = 60 * 60 * 24
+BUILD_CHUNK_SIZE = 10_000
+EMPTY = np.zeros(0, dtype=np.int32)
+
+# Рецепты, изменённые в текущей транзакции, до записи в журнал.
+_pending = threading.local()
+
+
+class PantryState:
+    """
+    Состояние индекса в памяти процесса.
+
+    postings — для каждого ингредиента отсортированный массив id
+    рецептов; recipes — пара отсортированных массивов (id рецептов,
+    количество их ингредиентов), заменяется целиком. Состав рецептов
+    на момент построения хранится в формате CSR (base_ids, offsets,
+    flat), изменённые после построения рецепты — в overrides.
+    """
+
+    def __init__(self, version, applied, pairs):
+        self.version = version
+        self.applied = applied
+        # Ключ recipe_id << 32 | ingredient_id: np.unique убирает
+        # повторы и сортирует пары по рецепту, затем по ингредиенту.
+        keys = np.unique((pairs[:, 0] << 32) | pairs[:, 1])
+        recipes = (keys >> 32).astype(np.int32)
+        ingredients = (keys & 0xFFFFFFFF).astype(np.int32)
+        self.base_ids, starts, sizes = np.unique(
+            recipes, return_index=True, return_counts=True
+        )
+        self.offsets = np.append(starts, len(recipes))
+        self.flat = ingredients
+        self.overrides = {}
+        self.recipes = (self.base_ids, sizes.astype(np.int32))
+        order = np.lexsort((recipes, ingredients))
+        ingredients = ingredients[order]
+        ingredient_ids, starts = np.unique(ingredients, return_index=True)
+        self.postings = dict(zip(
+            ingredient_ids.tolist(), np.split(recipes[order], starts[1:])
+        ))
+
+    def ingredients_of(self, recipe_id):
+        if recipe_id in self.overrides:
+            return self.overrides[recipe_id]
+        position = np.searchsorted(self.base_ids, recipe_id)
+        if (
+            position == len(self.base_ids)
+            or self.base_ids[position] != recipe_id
+        ):
+            return EMPTY
+        return self.flat[self.offsets[position]:self.offsets[position + 1]]
+
+    def apply(self, ingredients_by_recipe):
+        """
+        Заменяет состав перечисленных рецептов; пустой состав
+        удаляет рецепт из индекса.
+        """
+        recipe_ids, sizes = self.recipes
+        for recipe_id, ingredients in ingredients_by_recipe.items():
+            ingredients = np.unique(np.array(ingredients, dtype=np.int32))
+            old = self.ingredients_of(recipe_id)
+            for ingredient_id in np.setdiff1d(old, ingredients).tolist():
+                posting = self.postings[ingredient_id]
+                self.postings[ingredient_id] = posting[posting != recipe_id]
+            for ingredient_id in np.setdiff1d(ingredients, old).tolist():
+                posting = self.postings.get(ingredient_id, EMPTY)
+                self.postings[ingredient_id] = np.insert(
+                    posting, np.searchsorted(posting, recipe_id), recipe_id
+                )
+            self.overrides[recipe_id] = ingredients
+            position = np.searchsorted(recipe_ids, recipe_id)
+            exists = (
+                position < len(recipe_ids)
+                and recipe_ids[position] == recipe_id
+            )
+            if exists and not len(ingredients):
+                recipe_ids = np.delete(recipe_ids, position)
+                sizes = np.delete(sizes, position)
+            elif exists:
+                sizes = sizes.copy()
+                sizes[position] = len(ingredients)
+            elif len(ingredients):
+                recipe_ids = np.insert(recipe_ids, position, recipe_id)
+                sizes = np.insert(sizes, position, len(ingredients))
+        self.recipes = (recipe_ids, sizes)
+
+    def memory_size(self):
+        return sum(
+            array.nbytes for array in chain(
+                (self.base_ids, self.offsets, self.flat, *self.recipes),
+                self.postings.values(),
+                self.overrides.values(),
+            )
+        )
+
+
+class PantryIndex(VersionedState):
+    """
+    Обратный индекс «ингредиент → рецепты» в памяти процесса для
+    подбора рецептов по имеющимся ингредиентам.
+
+    Индекс строится одним запросом к IngredientQuantity. Как
+    и у справочников (api.catalog), версия хранится в общем кеше
+    (VersionedState): её смена заставляет все воркеры перестроить
+    индекс. Изменения
+    отдельных рецептов записываются в общий кеш пронумерованным
+    журналом; воркер перечитывает из базы состав только этих
+    рецептов. Если записи журнала вытеснены или их слишком много,
+    индекс строится заново.
+    """
+
+    version_key = VERSION_KEY
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.RLock()
+
+    def changed(self, recipe_ids):
+        """
+        Отмечает изменение состава рецептов. Рецепты копятся до
+        фиксации транзакции и попадают в журнал одной записью,
+        сколько бы строк IngredientQuantity ни изменилось.
+        Рецепты из откатившейся транзакции попадут в журнал
+        со следующей: лишняя запись безопасна.
+        """
+        if not hasattr(_pending, 'recipe_ids'):
+            _pending.recipe_ids = set()
+        _pending.recipe_ids.update(recipe_ids)
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        recipe_ids = getattr(_pending, 'recipe_ids', None)
+        if not recipe_ids:
+            return
+        _pending.recipe_ids = set()
+        self.publish(sorted(recipe_ids))
+
+    def publish(self, recipe_ids):
+        version = self.get_version()
+        changes_key = CHANGES_KEY.format(version=version)
+        cache.add(changes_key, 0, timeout=None)
+        number = cache.incr(changes_key)
+        cache.set(
+            CHANGE_KEY.format(version=version, number=number),
+            recipe_ids, timeout=CHANGE_TTL
+        )
+
+    def build(self, version):
+        applied = cache.get(CHANGES_KEY.format(version=version), 0)
+        rows = IngredientQuantity.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator(chunk_size=BUILD_CHUNK_SIZE)
+        pairs = np.fromiter(
+            chain.from_iterable(rows), dtype=np.int64
+        ).reshape(-1, 2)
+        return PantryState(version, applied, pairs)
+
+    def catch_up(self, state):
+        """
+        Применяет записи журнала после state.applied; False, если
+        журнал неполон и индекс нужно построить заново.
+        """
+        current = cache.get(CHANGES_KEY.format(version=state.version), 0)
+        if current <= state.applied:
+            return True
+        if current - state.applied > settings.PANTRY_INDEX_MAX_CHANGES:
+            return False
+        keys = [
+            CHANGE_KEY.format(version=state.version, number=number)
+            for number in range(state.applied + 1, current + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        ingredients_by_recipe = {
+            recipe_id: [] for recipe_id in chain(*changes.values())
+        }
+        for recipe_id, ingredient_id in IngredientQuantity.objects.filter(
+            recipe_id__in=ingredients_by_recipe
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients_by_recipe[recipe_id].append(ingredient_id)
+        state.apply(ingredients_by_recipe)
+        state.applied = current
+        return True
+
+    def get_state(self):
+        version = self.get_version()
+        with self._lock:
+            state = self._state
+            if (
+                state is None
+                or state.version != version
+                or not self.catch_up(state)
+            ):
+                state = self._state = self.build(version)
+        return state
+
+    def coverage(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов:
+        массивы id рецептов, количества имеющихся и недостающих
+        ингредиентов. Порядок — по возрастанию недостающих, затем
+        по убыванию имеющихся, затем от новых рецептов к старым.
+        """
+        with self._lock:
+            state = self.get_state()
+            postings = [
+                state.postings[pk] for pk in set(ingredient_ids)
+                if pk in state.postings
+            ]
+            recipe_ids, sizes = state.recipes
+        if not postings:
+            return EMPTY, EMPTY, EMPTY
+        # Слияние списков с подсчётом: сколько раз рецепт встретился —
+        # столько его ингредиентов есть у пользователя.
+        candidates, matched = np.unique(
+            np.concatenate(postings), return_counts=True
+        )
+        missing = sizes[np.searchsorted(recipe_ids, candidates)] - matched
+        order = np.lexsort((-candidates, -matched, missing))
+        return candidates[order], matched[order], missing[order]
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,84 @@
+import io
+import os
+
+from api.shopping_list import format_line
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'Arial'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'backend', 'data', 'arial.ttf')
+TITLE_FONT_SIZE = 14
+FONT_SIZE = 14
+FOOTER_FONT_SIZE = 10
+LINE_HEIGHT = 25
+LEFT_MARGIN = 75
+TOP_MARGIN = 50
+BOTTOM_MARGIN = 50
+
+
+def register_fonts():
+    """
+    Регистрирует шрифты один раз на процесс: разбор TTF-файла
+    выполняется при запуске приложения, а не в каждом запросе.
+    """
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class ShoppingListPDF:
+    """
+    Многостраничный PDF со списком покупок.
+    """
+    title = 'Список покупок:'
+
+    def __init__(self, buffer=None, pagesize=A4):
+        register_fonts()
+        self.buffer = buffer if buffer is not None else io.BytesIO()
+        self.width, self.height = pagesize
+        self.canvas = canvas.Canvas(self.buffer, pagesize=pagesize)
+        self.page_number = 0
+        self.y = None
+
+    def start_page(self):
+        self.page_number += 1
+        self.y = self.height - TOP_MARGIN
+        if self.page_number == 1:
+            self.canvas.setFont(FONT_NAME, TITLE_FONT_SIZE)
+            self.canvas.drawCentredString(self.width / 2, self.y, self.title)
+            self.y -= LINE_HEIGHT * 2
+        self.canvas.setFont(FONT_NAME, FONT_SIZE)
+
+    def finish_page(self):
+        self.canvas.setFont(FONT_NAME, FOOTER_FONT_SIZE)
+        self.canvas.drawCentredString(
+            self.width / 2, BOTTOM_MARGIN / 2, f'— {self.page_number} —'
+        )
+        self.canvas.showPage()
+
+    def draw_line(self, text):
+        if self.y is None:
+            self.start_page()
+        elif self.y < BOTTOM_MARGIN:
+            self.finish_page()
+            self.start_page()
+        self.canvas.drawString(LEFT_MARGIN, self.y, text)
+        self.y -= LINE_HEIGHT
+
+    def render(self, shopping_list):
+        """
+        Рисует список покупок и возвращает содержимое документа.
+        """
+        for number, item in enumerate(shopping_list, 1):
+            self.draw_line(format_line(number, item))
+        if self.y is None:
+            self.start_page()
+        self.finish_page()
+        self.canvas.save()
+        return self.buffer.getvalue()
+
+
+def render_shopping_list_pdf(shopping_list, buffer=None):
+    return ShoppingListPDF(buffer).render(shopping_list)
@@ -0,0 +1,116 @@
+import re
+from importlib import import_module
+
+from django.db import connection
+
+TERM_RE = re.compile(r'[^\W_]+')
+MAX_TERMS = 8
+
+
+class PostgreSQLSearch:
+    """
+    Поиск по вычисляемому столбцу search_vector с GIN-индексом:
+    название весит больше текста, ранг — ts_rank.
+    """
+    tables = ()
+    where = (
+        "recipes_recipe.search_vector @@ to_tsquery('russian', %s)",
+    )
+    rank_sql = (
+        'ts_rank(recipes_recipe.search_vector, '
+        "to_tsquery('russian', %s))"
+    )
+
+    def make_query(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+
+class SQLiteSearch:
+    """
+    Поиск по таблице FTS5 recipes_recipe_search для локальной
+    разработки: ранг — столбец rank, то есть bm25 с удвоенным весом
+    названия (задаётся в миграции).
+    """
+    tables = ('recipes_recipe_search',)
+    where = (
+        'recipes_recipe_search.rowid = recipes_recipe.id',
+        'recipes_recipe_search MATCH %s',
+    )
+    rank_sql = '-recipes_recipe_search.rank'
+
+    def make_query(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def restore_index(self, connection):
+        """
+        Пересоздаёт триггеры, которые удаляются вместе со старой
+        таблицей, когда миграция в SQLite пересобирает recipes_recipe
+        (ALTER через копию таблицы), и перестраивает индекс: изменения,
+        сделанные без триггеров, в него не попали.
+        """
+        migration = import_module('recipes.migrations.0008_recipe_search')
+        names = ['recipes_recipe_search', *migration.SQLITE_TRIGGERS]
+        placeholders = ', '.join(['%s'] * len(names))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT name FROM sqlite_master '
+                f'WHERE name IN ({placeholders})', names
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if 'recipes_recipe_search' not in existing:
+                return False
+            missing = [
+                sql for name, sql in migration.SQLITE_TRIGGERS.items()
+                if name not in existing
+            ]
+            for sql in missing:
+                cursor.execute(sql)
+            if missing:
+                cursor.execute(migration.SQLITE_REBUILD)
+        return bool(missing)
+
+
+BACKENDS = {
+    'postgresql': PostgreSQLSearch(),
+    'sqlite': SQLiteSearch(),
+}
+
+
+def get_terms(query):
+    """
+    Слова запроса без знаков препинания и операторов: все слова
+    должны встретиться в рецепте, каждое — как начало слова.
+    """
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def restore_search_index(connection):
+    """
+    Восстанавливает поисковый индекс после миграций (post_migrate);
+    True, если он был повреждён.
+    """
+    backend = BACKENDS.get(connection.vendor)
+    if not hasattr(backend, 'restore_index'):
+        return False
+    return backend.restore_index(connection)
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, в названии или тексте которых есть все слова запроса,
+    от более релевантных к менее релевантным.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset
+    backend = BACKENDS[connection.vendor]
+    query = backend.make_query(terms)
+    # Соединение с поисковой таблицей и ранг не выражаются через ORM
+    # в Django 2.2, поэтому extra().
+    return queryset.extra(
+        tables=backend.tables,
+        where=backend.where,
+        params=[query],
+        select={'search_rank': backend.rank_sql},
+        select_params=[query],
+    ).order_by('-search_rank', *queryset.model._meta.ordering)
@@ -0,0 +1,231 @@
+from api.counters import change_counter, change_counters
+from api.shopping_list import invalidate_cart_digests
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+class RelationToggle:
+    """
+    Связь пользователя с объектом, уникальная по паре
+    (избранное, список покупок, подписка).
+
+    Добавление — один INSERT с пропуском конфликта
+    (ON CONFLICT DO NOTHING в PostgreSQL, INSERT OR IGNORE в SQLite),
+    удаление — один DELETE по паре. Изменилась ли связь, решает
+    количество затронутых строк, поэтому повторный или параллельный
+    запрос не приводит к IntegrityError. Пакетные операции узнают
+    затронутые строки из RETURNING. Запросы идут мимо ORM
+    и сигналов модели: счётчик и on_change обновляются здесь же,
+    только если строка действительно добавлена или удалена.
+    """
+
+    def __init__(self, model, target, counter=None, on_change=None):
+        self.model = model
+        self.target = target
+        self.target_model = model._meta.get_field(target).related_model
+        self.counter = counter
+        self.on_change = on_change
+
+    def get_connection(self):
+        return connections[router.db_for_write(self.model)]
+
+    def get_columns(self, connection):
+        quote_name = connection.ops.quote_name
+        return (
+            quote_name(self.model._meta.db_table),
+            quote_name(self.model._meta.get_field('user').column),
+            quote_name(self.model._meta.get_field(self.target).column),
+        )
+
+    def execute(self, connection, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def execute_returning(self, connection, sql, params):
+        _, _, target_column = self.get_columns(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {target_column}', params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def can_return_rows(self, connection):
+        """
+        Поддерживает ли база RETURNING в INSERT и DELETE.
+        """
+        if connection.vendor == 'postgresql':
+            return True
+        if connection.vendor == 'sqlite':
+            return connection.Database.sqlite_version_info >= (3, 35)
+        return False
+
+    def insert_sql(self, connection, rows):
+        table, user_column, target_column = self.get_columns(connection)
+        values = ', '.join(['(%s, %s)'] * rows)
+        return (
+            f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+            f'{table} ({user_column}, {target_column}) VALUES {values} '
+            f'{connection.ops.ignore_conflicts_suffix_sql(True)}'
+        )
+
+    def delete_sql(self, connection, rows):
+        table, user_column, target_column = self.get_columns(connection)
+        placeholders = ', '.join(['%s'] * rows)
+        return (
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {target_column} IN ({placeholders})'
+        )
+
+    def changed(self, connection, user, target_id, delta):
+        if self.counter is not None:
+            change_counter(self.target_model, target_id, self.counter, delta)
+        if self.on_change is not None:
+            transaction.on_commit(
+                lambda: self.on_change(user), using=connection.alias
+            )
+
+    def add(self, user, target_id):
+        """
+        Добавляет связь; False, если она уже была.
+        """
+        connection = self.get_connection()
+        sql = self.insert_sql(connection, 1)
+        with transaction.atomic(using=connection.alias):
+            created = self.execute(connection, sql, (user.pk, target_id)) > 0
+            if created:
+                self.changed(connection, user, target_id, 1)
+        return created
+
+    def remove(self, user, target_id):
+        """
+        Удаляет связь; False, если её не было.
+        """
+        connection = self.get_connection()
+        sql = self.delete_sql(connection, 1)
+        with transaction.atomic(using=connection.alias):
+            deleted = self.execute(connection, sql, (user.pk, target_id)) > 0
+            if deleted:
+                self.changed(connection, user, target_id, -1)
+        return deleted
+
+    def read_batch(self, user, target_ids):
+        """
+        Какие из объектов существуют и связаны ли они с пользователем:
+        {id: связан ли} одним запросом.
+        """
+        return dict(
+            self.target_model.objects.filter(pk__in=target_ids).annotate(
+                linked=Exists(self.model.objects.filter(
+                    user=user, **{self.target: OuterRef('pk')}
+                ))
+            ).values_list('pk', 'linked')
+        )
+
+    def changed_many(self, user, target_ids, delta):
+        if not target_ids:
+            return
+        if self.counter is not None:
+            change_counters(
+                self.target_model, target_ids, self.counter, delta
+            )
+        if self.on_change is not None:
+            transaction.on_commit(lambda: self.on_change(user))
+
+    def insert_many(self, user, target_ids):
+        """
+        Добавляет связи одним INSERT ... RETURNING; возвращает id
+        объектов, для которых строка действительно добавлена.
+        Без поддержки RETURNING — запрос на каждый объект.
+        """
+        if not target_ids:
+            return set()
+        connection = self.get_connection()
+        if not self.can_return_rows(connection):
+            sql = self.insert_sql(connection, 1)
+            return {
+                pk for pk in target_ids
+                if self.execute(connection, sql, (user.pk, pk)) > 0
+            }
+        return self.execute_returning(
+            connection,
+            self.insert_sql(connection, len(target_ids)),
+            [value for pk in target_ids for value in (user.pk, pk)]
+        )
+
+    def delete_many(self, user, target_ids):
+        """
+        Удаляет связи одним DELETE ... RETURNING; возвращает id
+        объектов, для которых строка действительно удалена.
+        """
+        if not target_ids:
+            return set()
+        connection = self.get_connection()
+        if not self.can_return_rows(connection):
+            sql = self.delete_sql(connection, 1)
+            return {
+                pk for pk in target_ids
+                if self.execute(connection, sql, (user.pk, pk)) > 0
+            }
+        return self.execute_returning(
+            connection,
+            self.delete_sql(connection, len(target_ids)),
+            [user.pk, *target_ids]
+        )
+
+    @transaction.atomic
+    def add_many(self, user, target_ids):
+        """
+        Добавляет связи с несколькими объектами одним INSERT;
+        возвращает {id: статус}. Статусы и счётчики берутся
+        из действительно добавленных строк, а не из прочитанных
+        заранее: параллельный запрос не изменит счётчик дважды.
+        """
+        linked = self.read_batch(user, target_ids)
+        created = self.insert_many(
+            user, [pk for pk in target_ids if linked.get(pk) is False]
+        )
+        self.changed_many(user, sorted(created), 1)
+        return {
+            pk: NOT_FOUND if pk not in linked
+            else CREATED if pk in created else EXISTS
+            for pk in target_ids
+        }
+
+    @transaction.atomic
+    def remove_many(self, user, target_ids):
+        """
+        Удаляет связи с несколькими объектами одним DELETE;
+        возвращает {id: статус} по действительно удалённым строкам.
+        """
+        linked = self.read_batch(user, target_ids)
+        deleted = self.delete_many(
+            user, [pk for pk in target_ids if linked.get(pk)]
+        )
+        self.changed_many(user, sorted(deleted), -1)
+        return {
+            pk: NOT_FOUND if pk not in linked
+            else DELETED if pk in deleted else MISSING
+            for pk in target_ids
+        }
+
+
+def invalidate_cart_digest(user):
+    invalidate_cart_digests([user.pk])
+
+
+favorites = RelationToggle(Favorite, 'recipe', counter='favorites_count')
+shopping_carts = RelationToggle(
+    ShoppingCart, 'recipe',
+    counter='in_carts_count',
+    on_change=invalidate_cart_digest
+)
+follows = RelationToggle(Follow, 'author', counter='followers_count')
@@ -1,14 +1,42 @@
-import base64
+import binascii
 import re
+from collections import Counter
 
 import django.contrib.auth.password_validation as validators
+from api.catalog import tags_catalog
+from api.counters import change_counter
+from api.images import (ImageTooLarge, decode_base64_image, schedule_variants,
+                        variant_urls)
+from api.pantry import pantry_index
+from api.shopping_list import recipe_ingredients_changed
+from api.similarity import schedule_refresh
+from django.conf import settings
+from django.contrib.auth import authenticate
 from django.core import exceptions
-from django.core.files.base import ContentFile
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from djoser.serializers import TokenCreateSerializer
 from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
                             ShoppingCart, Tag)
 from rest_framework import serializers
 from users.models import Follow, User
 
+RECIPES_PREVIEW_LIMIT = 3
+
+
+def validate_unique_email(value, instance=None):
+    """
+    Адрес почты уникален без учёта регистра: проверка до сохранения
+    вместо ошибки уникального индекса LOWER(email).
+    """
+    users = User.objects.filter_by_email(value)
+    if instance is not None:
+        users = users.exclude(pk=instance.pk)
+    if users.exists():
+        raise serializers.ValidationError(
+            'Пользователь с таким адресом электронной почты уже существует')
+    return value
+
 
 class CreateUserSerializer(serializers.ModelSerializer):
     """
@@ -34,7 +62,7 @@ class CreateUserSerializer(serializers.ModelSerializer):
         if not regex.search(value):
             raise serializers.ValidationError(
                 'Адрес электронной почты содержит недопустимые символы')
-        return value
+        return validate_unique_email(value)
 
     def validate(self, data):
         user = User(**data)
@@ -66,7 +94,12 @@ class ShowUserSerializer(serializers.ModelSerializer):
             'is_subscribed',
         )
 
+    def validate_email(self, value):
+        return validate_unique_email(value, self.instance)
+
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (
             not user.is_anonymous
@@ -79,9 +112,18 @@ class ShowShortRecipeSerializer(serializers.ModelSerializer):
     Сериализатор для краткого отображения рецептов
     в подписках.
     """
+    image_variants = serializers.SerializerMethodField(
+        read_only=True
+    )
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        return variant_urls(
+            obj.image, obj.image_variants, self.context.get('request')
+        )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -105,10 +147,10 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientQuantityWriteSerializer(serializers.ModelSerializer):
     """
     Сериализатор для записи количества ингредиента в рецепте.
+    Существование ингредиентов проверяется одним запросом
+    в CreateUpdateRecipeSerializer.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientQuantity
@@ -144,27 +186,52 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField(
         read_only=True
     )
-    tags = TagSerializer(
-        many=True
+    tags = serializers.SerializerMethodField(
+        read_only=True
     )
-    author = ShowUserSerializer(
+    author = serializers.SerializerMethodField(
         read_only=True
     )
     ingredients = serializers.SerializerMethodField(
         read_only=True
     )
+    image_variants = serializers.SerializerMethodField(
+        read_only=True
+    )
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        return variant_urls(
+            obj.image, obj.image_variants, self.context.get('request')
+        )
+
+    def get_tags(self, obj):
+        tags = []
+        for tag in obj.tags.all():
+            data = tags_catalog.get(tag.pk)
+            if data is None:
+                data = TagSerializer(tag).data
+            tags.append(data)
+        return tags
+
+    def get_author(self, obj):
+        author = obj.author
+        if hasattr(obj, 'is_subscribed'):
+            author.is_subscribed = obj.is_subscribed
+        return ShowUserSerializer(author, context=self.context).data
 
     def get_ingredients(self, obj):
-        queryset = IngredientQuantity.objects.filter(recipe=obj)
+        queryset = obj.ingredients_quantities.all()
         return IngredientQuantityShowSerializer(queryset, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (
             not user.is_anonymous
@@ -172,6 +239,8 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (
             not user.is_anonymous
@@ -188,7 +257,17 @@ class Base64ImageField(serializers.ImageField):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                data = decode_base64_image(
+                    imgstr, ext, settings.RECIPE_IMAGE_MAX_SIZE
+                )
+            except ImageTooLarge:
+                raise serializers.ValidationError(
+                    'Размер изображения не должен превышать '
+                    + filesizeformat(settings.RECIPE_IMAGE_MAX_SIZE)
+                )
+            except binascii.Error:
+                self.fail('invalid_image')
         return super().to_internal_value(data)
 
 
@@ -201,46 +280,162 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
         allow_null=True
     )
     ingredients = IngredientQuantityWriteSerializer(many=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'ingredients', 'name',
                   'image', 'text', 'cooking_time')
 
+    @staticmethod
+    def resolve_ids(model, ids, label):
+        """
+        Находит объекты по списку id одним запросом;
+        возвращает их и сообщения о повторах и несуществующих id.
+        """
+        messages = []
+        duplicates = sorted(
+            pk for pk, count in Counter(ids).items() if count > 1
+        )
+        if duplicates:
+            messages.append(
+                f'{label} указаны повторно: '
+                + ', '.join(map(str, duplicates))
+            )
+        objects = model.objects.in_bulk(set(ids))
+        unknown = sorted(set(ids) - set(objects))
+        if unknown:
+            messages.append(
+                f'{label} не найдены: ' + ', '.join(map(str, unknown))
+            )
+        return objects, messages
+
+    def validate(self, data):
+        errors = {}
+        if 'ingredients' in data:
+            ingredients, messages = self.resolve_ids(
+                Ingredient,
+                [ingredient['id'] for ingredient in data['ingredients']],
+                'Ингредиенты'
+            )
+            if messages:
+                errors['ingredients'] = messages
+            for ingredient in data['ingredients']:
+                ingredient['id'] = ingredients.get(ingredient['id'])
+        if 'tags' in data:
+            tags, messages = self.resolve_ids(Tag, data['tags'], 'Теги')
+            if messages:
+                errors['tags'] = messages
+            data['tags'] = [tags.get(pk) for pk in data['tags']]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+    def set_ingredients(self, recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к переданному списку:
+        новые строки добавляются, изменённые обновляются,
+        лишние удаляются — каждое действие одним запросом.
+        """
+        amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            quantity.ingredient_id: quantity
+            for quantity in recipe.ingredients_quantities.all()
+        }
+        removed = [
+            quantity.pk for ingredient_id, quantity in existing.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        created = []
+        for ingredient_id, amount in amounts.items():
+            quantity = existing.get(ingredient_id)
+            if quantity is None:
+                created.append(IngredientQuantity(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                ))
+            elif quantity.amount != amount:
+                quantity.amount = amount
+                changed.append(quantity)
+        if removed:
+            IngredientQuantity.objects.filter(pk__in=removed).delete()
+        if changed:
+            IngredientQuantity.objects.bulk_update(changed, ('amount',))
+        if created:
+            IngredientQuantity.objects.bulk_create(created)
+            pantry_index.changed([recipe.pk])
+        if removed or changed or created:
+            # bulk_create и bulk_update не отправляют сигналы.
+            recipe_ingredients_changed([recipe.pk])
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
+        change_counter(User, author.pk, 'recipes_count', 1)
+        transaction.on_commit(lambda: schedule_variants(recipe.image))
         recipe.tags.set(tags)
-        for ingredient in ingredients:
-            IngredientQuantity.objects.create(
+        IngredientQuantity.objects.bulk_create(
+            IngredientQuantity(
                 recipe=recipe,
                 ingredient=ingredient['id'],
                 amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        )
+        pantry_index.changed([recipe.pk])
+        schedule_refresh([recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        IngredientQuantity.objects.filter(recipe=instance).delete()
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = instance
-        recipe.tags.set(tags)
-        for ingredient in ingredients:
-            IngredientQuantity.objects.create(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
-            )
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.set_ingredients(instance, ingredients)
+        if tags is not None or ingredients is not None:
+            schedule_refresh([instance.pk])
+        if validated_data.get('image'):
+            validated_data['image_variants'] = ''
+            transaction.on_commit(lambda: schedule_variants(instance.image))
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        """
+        Ответ читается тем же запросом, что и список: теги,
+        ингредиенты и признаки пользователя — без запроса на строку.
+        """
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_user_annotations(
+            request.user
+        ).get(pk=instance.pk)
         return ShowRecipeSerializer(instance, context=context).data
 
 
+def get_recipes_limit(request):
+    """
+    Количество рецептов в подписках из параметра recipes_limit.
+    """
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return RECIPES_PREVIEW_LIMIT
+    return max(limit, 0)
+
+
 class FollowAndSubscriptionsSerializer(serializers.ModelSerializer):
     """
     Сериализатор для создания и отображения подписок.
@@ -261,6 +456,8 @@ class FollowAndSubscriptionsSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (
             not user.is_anonymous
@@ -268,8 +465,84 @@ class FollowAndSubscriptionsSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj)[:3]
-        return ShowShortRecipeSerializer(queryset, many=True).data
+        if hasattr(obj, 'recipe_previews'):
+            queryset = obj.recipe_previews
+        else:
+            limit = get_recipes_limit(self.context['request'])
+            queryset = Recipe.objects.filter(author=obj)[:limit]
+        return ShowShortRecipeSerializer(
+            queryset, many=True, context=self.context
+        ).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
+
+
+class RelationBatchSerializer(serializers.Serializer):
+    """
+    Сериализатор списка id для пакетного добавления
+    и удаления связей.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RELATION_BATCH_LIMIT,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class PantrySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров подбора рецептов по имеющимся
+    ингредиентам.
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PANTRY_INGREDIENTS_LIMIT,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class SimilarRecipeSerializer(ShowShortRecipeSerializer):
+    """
+    Сериализатор похожего рецепта с оценкой сходства.
+    """
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ShowShortRecipeSerializer.Meta):
+        fields = ShowShortRecipeSerializer.Meta.fields + ('score',)
+
+
+class CoverageRecipeSerializer(ShowRecipeSerializer):
+    """
+    Сериализатор рецепта с количеством имеющихся и недостающих
+    ингредиентов.
+    """
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(ShowRecipeSerializer.Meta):
+        fields = ShowRecipeSerializer.Meta.fields + (
+            'matched_count', 'missing_count'
+        )
+
+
+class EmailTokenCreateSerializer(TokenCreateSerializer):
+    """
+    Сериализатор входа: только authenticate() по адресу почты,
+    без повторного поиска пользователя и второй проверки пароля
+    в djoser.
+    """
+
+    def validate(self, attrs):
+        self.user = authenticate(
+            request=self.context.get('request'),
+            email=attrs.get('email'),
+            password=attrs.get('password'),
+        )
+        if self.user is None:
+            self.fail('invalid_credentials')
+        return attrs
@@ -0,0 +1,179 @@
+import csv
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Sum
+from recipes.models import IngredientQuantity, ShoppingCart
+
+SHOPPING_LIST_FORMATS = ('pdf', 'txt', 'csv')
+GENERATION_KEY = 'shopping_list:generation'
+DIGEST_KEY = 'shopping_list:digest:{generation}:{user_id}'
+DOCUMENT_KEY = 'shopping_list:document:{digest}:{file_format}'
+
+_pending = threading.local()
+
+
+def get_cache():
+    return caches[settings.SHOPPING_LIST_CACHE]
+
+
+def get_generation():
+    """
+    Поколение справочника ингредиентов: меняется при изменении
+    ингредиентов и делает недействительными все ранее
+    сформированные списки.
+    """
+    cache = get_cache()
+    cache.add(GENERATION_KEY, 1, timeout=None)
+    return cache.get(GENERATION_KEY, 1)
+
+
+def bump_generation():
+    """
+    Меняет поколение после фиксации транзакции.
+    """
+    transaction.on_commit(increment_generation)
+
+
+def increment_generation():
+    cache = get_cache()
+    cache.add(GENERATION_KEY, 1, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, timeout=None)
+
+
+def get_cart_digest(user):
+    """
+    Хеш содержимого списка покупок: рецепты и строки
+    IngredientQuantity, в которые они раскрываются.
+    """
+    cache = get_cache()
+    generation = get_generation()
+    key = DIGEST_KEY.format(generation=generation, user_id=user.pk)
+    digest = cache.get(key)
+    if digest is None:
+        rows = IngredientQuantity.objects.filter(
+            recipe__shopping_carts__user=user
+        ).order_by(
+            'recipe_id', 'ingredient_id', 'id'
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+        content = hashlib.sha1(f'{generation}:'.encode())
+        for row in rows.iterator():
+            content.update(repr(row).encode())
+        digest = content.hexdigest()
+        cache.set(key, digest)
+    return digest
+
+
+def invalidate_cart_digests(user_ids):
+    generation = get_generation()
+    get_cache().delete_many([
+        DIGEST_KEY.format(generation=generation, user_id=user_id)
+        for user_id in user_ids
+    ])
+
+
+def cart_digests_changed(user_ids):
+    """
+    Сбрасывает дайджесты после фиксации транзакции: скачивание
+    между сбросом и фиксацией сохранило бы дайджест старых строк.
+    """
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: invalidate_cart_digests(user_ids))
+
+
+def recipe_ingredients_changed(recipe_ids):
+    """
+    Отмечает изменение состава рецептов. Рецепты копятся до фиксации
+    транзакции, затем дайджесты пользователей, у которых они в списке
+    покупок, сбрасываются одним запросом — сколько бы строк
+    IngredientQuantity ни изменилось, в том числе при каскадном
+    удалении рецепта. Рецепты из откатившейся транзакции сбрасываются
+    со следующей: лишний сброс безопасен.
+    """
+    if not hasattr(_pending, 'recipe_ids'):
+        _pending.recipe_ids = set()
+    _pending.recipe_ids.update(recipe_ids)
+    transaction.on_commit(flush_recipe_ingredients)
+
+
+def flush_recipe_ingredients():
+    recipe_ids = getattr(_pending, 'recipe_ids', None)
+    if not recipe_ids:
+        return
+    _pending.recipe_ids = set()
+    invalidate_cart_digests(
+        ShoppingCart.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('user_id', flat=True).distinct()
+    )
+
+
+def get_cached_document(digest, file_format):
+    return get_cache().get(
+        DOCUMENT_KEY.format(digest=digest, file_format=file_format)
+    )
+
+
+def set_cached_document(digest, file_format, document):
+    get_cache().set(
+        DOCUMENT_KEY.format(digest=digest, file_format=file_format),
+        document
+    )
+
+
+def get_shopping_list(user):
+    """
+    Суммарное количество ингредиентов из списка покупок пользователя,
+    сгруппированное по названию и единице измерения.
+    """
+    return IngredientQuantity.objects.filter(
+        recipe__shopping_carts__user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    )
+
+
+def format_line(number, item):
+    """
+    Строка списка покупок в человекочитаемом виде.
+    """
+    return (f'{number}) {item["ingredient__name"].capitalize()} - '
+            f'{item["total_amount"]} {item["ingredient__measurement_unit"]}.')
+
+
+def iter_txt(shopping_list):
+    yield 'Список покупок:\n'
+    for number, item in enumerate(shopping_list, 1):
+        yield format_line(number, item) + '\n'
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(shopping_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for item in shopping_list:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['total_amount'],
+            item['ingredient__measurement_unit']
+        ))
@@ -0,0 +1,67 @@
+from api import versions
+from api.authentication import token_cache
+from api.catalog import ingredients_catalog, tags_catalog
+from api.pantry import pantry_index
+from api.recipe_search import restore_search_index
+from api.shopping_list import (bump_generation, cart_digests_changed,
+                               recipe_ingredients_changed)
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, IngredientQuantity, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    cart_digests_changed([instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientQuantity)
+def ingredient_quantity_changed(sender, instance, **kwargs):
+    pantry_index.changed([instance.recipe_id])
+    recipe_ingredients_changed([instance.recipe_id])
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    bump_generation()
+    ingredients_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    tags_catalog.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    # Вход обновляет только last_login — он не влияет на доступ.
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    token_cache.invalidate(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+
+
+@receiver(request_started)
+def request_started_handler(sender, **kwargs):
+    versions.start_request()
+
+
+@receiver(request_finished)
+def request_finished_handler(sender, **kwargs):
+    versions.finish_request()
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    if sender.label == 'recipes':
+        restore_search_index(connections[using])
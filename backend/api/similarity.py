@@ -0,0 +1,288 @@
+import logging
+from itertools import chain
+
+import numpy as np
+from api.background import run_in_background
+from api.instrumentation import track_job
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Min
+from recipes.models import IngredientQuantity, Recipe, SimilarRecipe
+from scipy.sparse import csr_matrix
+
+logger = logging.getLogger(__name__)
+
+INGREDIENT, TAG = 0, 1
+TAG_WEIGHT = 0.5
+WRITE_BATCH_SIZE = 5000
+
+
+def feature_keys(ids, kind):
+    """
+    Номер признака: ингредиенты — чётные, теги — нечётные.
+    """
+    return np.asarray(ids, dtype=np.int64) * 2 + kind
+
+
+def fetch_pairs(queryset, field):
+    rows = queryset.values_list('recipe_id', field).iterator(
+        chunk_size=WRITE_BATCH_SIZE
+    )
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(
+        -1, 2
+    )
+
+
+def load_features(**lookups):
+    """
+    Пары (id рецепта, признак) для рецептов, отобранных lookups.
+    """
+    ingredients = fetch_pairs(
+        IngredientQuantity.objects.filter(**lookups), 'ingredient_id'
+    )
+    tags = fetch_pairs(
+        Recipe.tags.through.objects.filter(**lookups), 'tag_id'
+    )
+    return (
+        np.concatenate((ingredients[:, 0], tags[:, 0])),
+        np.concatenate((
+            feature_keys(ingredients[:, 1], INGREDIENT),
+            feature_keys(tags[:, 1], TAG),
+        )),
+    )
+
+
+def count_features(keys):
+    """
+    Количество рецептов с каждым из признаков: два запроса
+    с группировкой по ингредиенту и по тегу.
+    """
+    keys = np.unique(keys)
+    counts = dict(chain(
+        (
+            (int(feature_keys(pk, INGREDIENT)), total)
+            for pk, total in IngredientQuantity.objects.filter(
+                ingredient_id__in=(keys[keys % 2 == INGREDIENT] // 2).tolist()
+            ).order_by().values('ingredient_id').annotate(
+                total=Count('recipe_id', distinct=True)
+            ).values_list('ingredient_id', 'total')
+        ),
+        (
+            (int(feature_keys(pk, TAG)), total)
+            for pk, total in Recipe.tags.through.objects.filter(
+                tag_id__in=(keys[keys % 2 == TAG] // 2).tolist()
+            ).order_by().values('tag_id').annotate(
+                total=Count('recipe_id', distinct=True)
+            ).values_list('tag_id', 'total')
+        ),
+    ))
+    return keys, np.array([counts.get(int(key), 0) for key in keys])
+
+
+def count_pairs(recipes, keys):
+    """
+    Количество рецептов с каждым из признаков по самим парам.
+    """
+    return np.unique(
+        np.unique((recipes << 34) | keys) & (2 ** 34 - 1),
+        return_counts=True
+    )
+
+
+def encode(recipes, keys, feature_counts, total):
+    """
+    Векторы рецептов: вес признака — сглаженный IDF (у тегов
+    умножен на TAG_WEIGHT), строки нормированы по всем признакам.
+    В матрицу попадают только признаки, встречающиеся не более
+    чем в SIMILAR_RECIPES_MAX_DF рецептах: частые признаки почти
+    не влияют на косинус, но дают больше всего пар-кандидатов.
+    Возвращает id рецептов по строкам и матрицу CSR.
+    """
+    pairs = np.unique((recipes << 34) | keys)
+    recipes, keys = pairs >> 34, pairs & (2 ** 34 - 1)
+    recipe_ids, rows = np.unique(recipes, return_inverse=True)
+    features, columns = np.unique(keys, return_inverse=True)
+    counted, counts = feature_counts
+    counts = counts[np.searchsorted(counted, features)]
+    weights = np.log((1 + total) / (1 + counts)) + 1
+    weights[features % 2 == TAG] *= TAG_WEIGHT
+    values = weights[columns]
+    values /= np.sqrt(np.bincount(rows, weights=values ** 2))[rows]
+    kept = counts[columns] <= settings.SIMILAR_RECIPES_MAX_DF
+    matrix = csr_matrix(
+        (values[kept], (rows[kept], columns[kept])),
+        shape=(len(recipe_ids), len(features)),
+        dtype=np.float32,
+    )
+    return recipe_ids, matrix
+
+
+def top_neighbours(scores, query_ids, ids, count):
+    """
+    Лучшие count соседей для каждой строки матрицы сходства
+    (без самого рецепта): массивы id рецептов, id соседей и оценок.
+    """
+    scores = scores.tocsr()
+    rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+    columns, values = scores.indices, scores.data
+    selected = (query_ids[rows] != ids[columns]) & (values > 0)
+    rows, columns = rows[selected], columns[selected]
+    values = values[selected]
+    # Оценки не больше 1, поэтому одна сортировка по ключу
+    # «строка × 2 − оценка» группирует по строкам и внутри строки
+    # упорядочивает по убыванию оценки.
+    order = np.argsort(rows * 2.0 - values, kind='stable')
+    rows, columns, values = rows[order], columns[order], values[order]
+    counts = np.bincount(rows, minlength=scores.shape[0])
+    starts = np.cumsum(counts) - counts
+    selected = np.arange(len(rows)) - np.repeat(starts, counts) < count
+    return (
+        query_ids[rows[selected]], ids[columns[selected]], values[selected]
+    )
+
+
+def iter_neighbours(recipe_ids, matrix, count, batch_size):
+    """
+    Соседи всех рецептов пакетами по batch_size строк: одно
+    умножение разреженных матриц на пакет.
+    """
+    transposed = matrix.T.tocsr()
+    for start in range(0, matrix.shape[0], batch_size):
+        yield top_neighbours(
+            matrix[start:start + batch_size] @ transposed,
+            recipe_ids[start:start + batch_size], recipe_ids, count
+        )
+
+
+def save_neighbours(recipes, similar, scores):
+    for start in range(0, len(recipes), WRITE_BATCH_SIZE):
+        end = start + WRITE_BATCH_SIZE
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for recipe_id, similar_id, score in zip(
+                recipes[start:end].tolist(), similar[start:end].tolist(),
+                scores[start:end].tolist()
+            )
+        ], ignore_conflicts=True)
+
+
+def rebuild(batch_size=None):
+    """
+    Пересчитывает соседей всех рецептов. Возвращает количество
+    рецептов и записанных пар.
+    """
+    recipes, keys = load_features()
+    recipe_ids, matrix = encode(
+        recipes, keys, count_pairs(recipes, keys), Recipe.objects.count()
+    )
+    written = 0
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        for batch in iter_neighbours(
+            recipe_ids, matrix, settings.SIMILAR_RECIPES_COUNT,
+            batch_size or settings.SIMILAR_RECIPES_BATCH_SIZE
+        ):
+            save_neighbours(*batch)
+            written += len(batch[0])
+    return len(recipe_ids), written
+
+
+@transaction.atomic
+def refresh(recipe_ids):
+    """
+    Пересчитывает соседей изменённых рецептов и обновляет их
+    в списках рецептов-кандидатов, не перестраивая всю матрицу:
+    кандидаты — рецепты с общими редкими признаками. Рецепт,
+    переставший быть похожим, удаляется из чужих списков, и они
+    остаются короче SIMILAR_RECIPES_COUNT до полной перестройки.
+    """
+    count = settings.SIMILAR_RECIPES_COUNT
+    max_df = settings.SIMILAR_RECIPES_MAX_DF
+    SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+    SimilarRecipe.objects.filter(similar_id__in=recipe_ids).delete()
+    recipes, keys = load_features(recipe_id__in=recipe_ids)
+    if not len(recipes):
+        return
+    changed_counts = count_features(keys)
+    rare = changed_counts[0][changed_counts[1] <= max_df]
+    recipes, keys = load_features(recipe_id__in=list(set(chain(
+        recipe_ids,
+        IngredientQuantity.objects.filter(
+            ingredient_id__in=(rare[rare % 2 == INGREDIENT] // 2).tolist()
+        ).values_list('recipe_id', flat=True),
+        Recipe.tags.through.objects.filter(
+            tag_id__in=(rare[rare % 2 == TAG] // 2).tolist()
+        ).values_list('recipe_id', flat=True),
+    ))))
+    ids, matrix = encode(
+        recipes, keys, count_features(keys), Recipe.objects.count()
+    )
+    positions = np.flatnonzero(np.isin(ids, recipe_ids))
+    scores = matrix[positions] @ matrix.T
+    forward = top_neighbours(scores, ids[positions], ids, count)
+    # Обратные пары: изменённый рецепт попадает в список соседа,
+    # если список неполон или рецепт похожее худшего в нём.
+    similar, recipes, values = top_neighbours(
+        scores, ids[positions], ids, len(ids)
+    )
+    current = {
+        recipe_id: (total, lowest)
+        for recipe_id, total, lowest in SimilarRecipe.objects.filter(
+            recipe_id__in=np.unique(recipes).tolist()
+        ).order_by().values('recipe_id').annotate(
+            total=Count('id'), lowest=Min('score')
+        ).values_list('recipe_id', 'total', 'lowest')
+    }
+    selected = np.array([
+        recipe_id not in current
+        or current[recipe_id][0] < count
+        or value > current[recipe_id][1]
+        for recipe_id, value in zip(recipes.tolist(), values.tolist())
+    ], dtype=bool) & ~np.isin(recipes, recipe_ids)
+    # Прямые и обратные пары записываются вместе: списки изменённых
+    # рецептов из обратных пар исключены, поэтому порядок не важен.
+    save_neighbours(*(
+        np.concatenate(arrays) for arrays in zip(
+            forward, (recipes[selected], similar[selected], values[selected])
+        )
+    ))
+    trim(np.unique(recipes[selected]).tolist(), count)
+
+
+def trim(recipe_ids, count):
+    """
+    Оставляет в списках рецептов не больше count лучших соседей.
+    """
+    extra, seen = [], {}
+    for pk, recipe_id in SimilarRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('recipe_id', '-score').values_list('pk', 'recipe_id'):
+        seen[recipe_id] = seen.get(recipe_id, 0) + 1
+        if seen[recipe_id] > count:
+            extra.append(pk)
+    if extra:
+        SimilarRecipe.objects.filter(pk__in=extra).delete()
+
+
+def _refresh_safely(recipe_ids):
+    try:
+        with track_job('similar-recipes-refresh'):
+            refresh(recipe_ids)
+    except Exception:
+        logger.exception('Не удалось обновить похожие рецепты %s', recipe_ids)
+    finally:
+        if settings.SIMILAR_RECIPES_WORKERS:
+            connections.close_all()
+
+
+def schedule_refresh(recipe_ids):
+    """
+    После фиксации транзакции ставит пересчёт соседей в фоновый
+    пул потоков; при SIMILAR_RECIPES_WORKERS = 0 выполняет сразу.
+    """
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: run_in_background(
+        'similar-recipes', settings.SIMILAR_RECIPES_WORKERS,
+        _refresh_safely, recipe_ids
+    ))
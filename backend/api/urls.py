@@ -1,6 +1,8 @@
 from api.views import (DownloadShoppingCartAPIView, FavoriteAPIView,
-                       FollowAPIView, IngredientView, RecipeView,
-                       ShoppingCartAPIView, SubscriptionsView, TagView)
+                       FavoriteBatchAPIView, FollowAPIView,
+                       FollowBatchAPIView, IngredientView, RecipeView,
+                       ShoppingCartAPIView, ShoppingCartBatchAPIView,
+                       SubscriptionsView, TagView, UserView)
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import include, path
@@ -10,17 +12,65 @@ router = DefaultRouter()
 router.register('tags', TagView, basename='tags')
 router.register('ingredients', IngredientView, basename='ingredients')
 router.register('recipes', RecipeView, basename='recipies')
+router.register('users', UserView, basename='users')
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('users/subscriptions/', SubscriptionsView.as_view()),
-    path('users/<int:id>/subscribe/', FollowAPIView.as_view()),
-    path('', include('djoser.urls')),
+    path('users/subscriptions/', SubscriptionsView.as_view(),
+         name='subscriptions'),
+    path('users/<int:id>/subscribe/', FollowAPIView.as_view(),
+         name='subscribe'),
+    path('users/subscribe/', FollowBatchAPIView.as_view(),
+         name='subscribe-batch'),
     path('recipes/download_shopping_cart/',
-         DownloadShoppingCartAPIView.as_view()),
-    path('recipes/<int:id>/favorite/', FavoriteAPIView.as_view()),
-    path('recipes/<int:id>/shopping_cart/', ShoppingCartAPIView.as_view()),
+         DownloadShoppingCartAPIView.as_view(),
+         name='download-shopping-cart'),
+    path('recipes/<int:id>/favorite/', FavoriteAPIView.as_view(),
+         name='favorite'),
+    path('recipes/<int:id>/shopping_cart/', ShoppingCartAPIView.as_view(),
+         name='shopping-cart'),
+    path('recipes/favorite/', FavoriteBatchAPIView.as_view(),
+         name='favorite-batch'),
+    path('recipes/shopping_cart/', ShoppingCartBatchAPIView.as_view(),
+         name='shopping-cart-batch'),
     path('', include(router.urls)),
 ]
 urlpatterns += static(
     settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
 )
+
+# Наибольшее количество запросов к базе по эндпоинтам и методам
+# (api.instrumentation); с учётом промаха кеша токенов. Проверка:
+# manage.py query_report --check.
+QUERY_BUDGETS = {
+    'api-root': {'GET': 1},
+    'login': {'POST': 6},
+    'logout': {'POST': 5},
+    'tags-list': {'GET': 2},
+    'tags-detail': {'GET': 2},
+    'ingredients-list': {'GET': 2},
+    'ingredients-detail': {'GET': 2},
+    'recipies-list': {'GET': 6, 'POST': 14},
+    'recipies-detail': {'GET': 5, 'PATCH': 15, 'DELETE': 15},
+    'recipies-feed': {'GET': 4},
+    'recipies-cook': {'GET': 4},
+    'recipies-similar': {'GET': 2},
+    'download-shopping-cart': {'GET': 3},
+    'favorite': {'POST': 5, 'DELETE': 4},
+    'shopping-cart': {'POST': 5, 'DELETE': 4},
+    'favorite-batch': {'POST': 5, 'DELETE': 5},
+    'shopping-cart-batch': {'POST': 5, 'DELETE': 5},
+    'subscriptions': {'GET': 4},
+    'subscribe': {'POST': 6, 'DELETE': 4},
+    'subscribe-batch': {'POST': 5, 'DELETE': 5},
+    'users-list': {'GET': 4, 'POST': 3},
+    'users-detail': {'GET': 3},
+    'users-me': {'GET': 3},
+    'users-set-password': {'POST': 3},
+    # Фоновые задачи (api.instrumentation.track_job): считаются
+    # отдельно от запроса, даже если выполняются в нём синхронно.
+    # Пересчёт соседей зависит от данных (пакеты записи, удаление
+    # лишних соседей): бюджет — по benchmark_api на 1000 и 10000
+    # рецептов seed_benchmark.
+    'similar-recipes-refresh': {'JOB': 20},
+    'image-variants': {'JOB': 1},
+}
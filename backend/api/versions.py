@@ -0,0 +1,59 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Версии, прочитанные в текущем запросе; вне запроса (команды,
+# фоновые потоки) — None, и версия читается каждый раз.
+_request = threading.local()
+
+
+def start_request():
+    _request.versions = {}
+
+
+def finish_request():
+    _request.versions = None
+
+
+class VersionedState:
+    """
+    Данные в памяти процесса (self._state), версия которых хранится
+    в общем кеше (CACHES['default']) по ключу version_key.
+
+    Сброс в одном воркере меняет версию, и остальные перечитывают
+    данные при следующем обращении. В пределах запроса версия
+    читается из общего кеша один раз.
+    """
+    version_key = None
+
+    def __init__(self):
+        self._state = None
+
+    def get_version(self):
+        versions = getattr(_request, 'versions', None)
+        if versions is not None and self.version_key in versions:
+            return versions[self.version_key]
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self.version_key)
+        if versions is not None:
+            versions[self.version_key] = version
+        return version
+
+    def invalidate(self):
+        """
+        Меняет версию после фиксации транзакции: иначе другой воркер
+        успеет загрузить под новой версией старые строки.
+        """
+        transaction.on_commit(self.reset)
+
+    def reset(self):
+        version = uuid.uuid4().hex
+        cache.set(self.version_key, version, timeout=None)
+        self._state = None
+        versions = getattr(_request, 'versions', None)
+        if versions is not None:
+            versions[self.version_key] = version
@@ -1,19 +1,41 @@
 from http import HTTPStatus
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.caching import (ConditionalGetMixin, make_etag,
+                         patch_caching_headers)
+from api.catalog import ingredients_catalog, tags_catalog
+from api.counters import change_counter
+from api.filters import RecipeFilter
+from api.ingredient_search import ingredient_index
+from api.pagination import (LimitPageNumberPagination,
+                            ModelOrderingCursorPagination)
+from api.pantry import pantry_index
+from api.pdf import render_shopping_list_pdf
 from api.permissions import IsAuthorOrIsAuthenticatedOrReadOnly
-from api.serializers import (CreateUpdateRecipeSerializer,
+from api.relations import SELF, favorites, follows, shopping_carts
+from api.serializers import (CoverageRecipeSerializer,
+                             CreateUpdateRecipeSerializer,
                              FollowAndSubscriptionsSerializer,
-                             IngredientSerializer, ShowRecipeSerializer,
-                             ShowShortRecipeSerializer, TagSerializer)
+                             IngredientSerializer, PantrySerializer,
+                             RelationBatchSerializer, ShowRecipeSerializer,
+                             ShowShortRecipeSerializer,
+                             SimilarRecipeSerializer, TagSerializer,
+                             get_recipes_limit)
+from api.shopping_list import (SHOPPING_LIST_FORMATS, get_cached_document,
+                               get_cart_digest, get_shopping_list, iter_csv,
+                               iter_txt, set_cached_document)
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, Max, OuterRef,
+                              Value)
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                            ShoppingCart, Tag)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from djoser.views import UserViewSet
+from recipes.models import Ingredient, Recipe, SimilarRecipe, Tag
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView, get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -21,139 +43,391 @@ from rest_framework.views import APIView
 from users.models import Follow, User
 
 
-class TagView(viewsets.ReadOnlyModelViewSet):
+class CatalogViewMixin:
+    """
+    Чтение справочника из памяти процесса (api.catalog)
+    с сильным ETag и ответом 304 на If-None-Match.
+    """
+    catalog = None
+
+    def catalog_response(self, request, get_data, etag=None):
+        etag = etag or self.catalog.etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(get_data())
+        return patch_caching_headers(request, response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(request, self.catalog.all)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            item = self.catalog.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            item = None
+        if item is None:
+            raise Http404
+        return self.catalog_response(request, lambda: item)
+
+
+class TagView(CatalogViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для вывода тегов без пагинации.
     """
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
+    catalog = tags_catalog
 
 
-class IngredientView(viewsets.ReadOnlyModelViewSet):
+class IngredientView(CatalogViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для вывода ингредиентов;
-    с фильтрацией, без пагинации.
+    с поиском по названию, без пагинации.
     """
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
-    filter_backends = (DjangoFilterBackend,)
-    filter_class = IngredientFilter
     pagination_class = None
+    catalog = ingredients_catalog
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get(
+            'limit', settings.INGREDIENT_SEARCH_LIMIT
+        )
+        try:
+            limit = min(int(limit), settings.INGREDIENT_SEARCH_LIMIT)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(
+                {'errors': 'limit должен быть положительным числом'},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        return self.catalog_response(
+            request,
+            lambda: ingredient_index.search(name, limit),
+            make_etag(self.catalog.etag(), name.lower(), limit)
+        )
 
 
-class RecipeView(viewsets.ModelViewSet):
+class RecipeView(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Вьюсет для отображения, создания,
     частичного изменения, удаления рецептов;
     с фильтрацией и пагинацией;
     с разными правами доступа.
     """
-    queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipeFilter
     permission_classes = (IsAuthorOrIsAuthenticatedOrReadOnly,)
 
+    def get_queryset(self):
+        return Recipe.objects.with_user_annotations(self.request.user)
+
+    def get_object_validators(self):
+        """
+        Рецепт зависит от своей даты изменения, автора, справочников
+        и признаков пользователя — всё это читается одним запросом
+        без подгрузки тегов и ингредиентов.
+        """
+        try:
+            row = Recipe.objects.filter(
+                pk=self.kwargs[self.lookup_field]
+            ).with_user_flags(self.request.user).values_list(
+                'updated_at', 'author__updated_at', 'is_favorited',
+                'is_in_shopping_cart', 'is_subscribed'
+            ).first()
+        except ValueError:
+            return None
+        if row is None:
+            return None
+        return make_etag(
+            'recipe', self.kwargs[self.lookup_field], *row,
+            tags_catalog.etag(), ingredients_catalog.etag()
+        ), None
+
+    def get_list_validators(self):
+        """
+        Страница списка для анонимного пользователя: количество
+        и последние изменения отфильтрованных рецептов и их авторов.
+        Страницы с признаками пользователя не проверяются.
+        """
+        if self.request.user.is_authenticated:
+            return None
+        summary = self.filter_queryset(self.get_queryset()).aggregate(
+            count=Count('id'),
+            updated_at=Max('updated_at'),
+            authors_updated_at=Max('author__updated_at'),
+        )
+        return make_etag(
+            'recipes', self.request.get_full_path(),
+            *summary.values(),
+            tags_catalog.etag(), ingredients_catalog.etag()
+        ), None
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """
+        Рецепты авторов, на которых подписан пользователь,
+        от новых к старым; пагинация по курсору.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__in=Follow.objects.filter(
+                user=request.user
+            ).values('author')
+        )
+        paginator = ModelOrderingCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def cook(self, request):
+        """
+        Рецепты из имеющихся ингредиентов (?ingredients=1&ingredients=2):
+        сначала те, где меньше недостающих ингредиентов; max_missing
+        ограничивает их количество. Порядок и счётчики берутся
+        из индекса api.pantry, из базы читается только страница.
+        """
+        data = {'ingredients': request.query_params.getlist('ingredients')}
+        if 'max_missing' in request.query_params:
+            data['max_missing'] = request.query_params['max_missing']
+        serializer = PantrySerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids, matched, missing = pantry_index.coverage(
+            serializer.validated_data['ingredients']
+        )
+        max_missing = serializer.validated_data.get('max_missing')
+        if max_missing is not None:
+            selected = missing <= max_missing
+            recipe_ids = recipe_ids[selected]
+            matched = matched[selected]
+            missing = missing[selected]
+        paginator = LimitPageNumberPagination()
+        page = paginator.paginate_queryset(
+            range(len(recipe_ids)), request, view=self
+        )
+        positions = list(page)
+        recipes = self.get_queryset().in_bulk(
+            recipe_ids[positions].tolist()
+        )
+        results = []
+        for position in positions:
+            recipe = recipes.get(int(recipe_ids[position]))
+            if recipe is None:
+                continue
+            recipe.matched_count = int(matched[position])
+            recipe.missing_count = int(missing[position])
+            results.append(recipe)
+        serializer = CoverageRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты из таблицы SimilarRecipe (api.similarity),
+        от более похожих к менее похожим.
+        """
+        try:
+            neighbours = list(SimilarRecipe.objects.filter(
+                recipe_id=pk
+            ).select_related('similar')[:settings.SIMILAR_RECIPES_COUNT])
+        except ValueError:
+            raise Http404
+        if not neighbours:
+            get_object_or_404(Recipe, pk=pk)
+        recipes = []
+        for neighbour in neighbours:
+            neighbour.similar.score = neighbour.score
+            recipes.append(neighbour.similar)
+        serializer = SimilarRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+        instance.delete()
+
     def get_serializer_class(self):
         if self.action in ('create', 'partial_update'):
             return CreateUpdateRecipeSerializer
         return ShowRecipeSerializer
 
 
-class FavoriteAPIView(APIView):
+class UserView(ConditionalGetMixin, UserViewSet):
     """
-    Вью-класс для создания и удаления подписок;
-    для авторизованных пользователей.
+    Вьюсет пользователей djoser с условными GET-запросами
+    и признаком подписки, вычисленным в запросе списка.
     """
-    permission_classes = (IsAuthenticated,)
 
-    def post(self, request, id):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        if Favorite.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists():
-            return Response(
-                {'errors': 'Этот рецепт уже был добавлен в избранное'},
-                status=HTTPStatus.BAD_REQUEST
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset()
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
             )
-        Favorite.objects.create(
-            user=user,
-            recipe=recipe
-        )
-        return Response(
-            ShowShortRecipeSerializer(recipe).data,
-            status=HTTPStatus.CREATED
+        return queryset.annotate(
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
         )
 
-    def delete(self, request, id):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        if not Favorite.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists():
-            return Response(
-                {'errors': 'Такого рецепта нет в избранном'},
-                status=HTTPStatus.BAD_REQUEST
-            )
-        Favorite.objects.get(
-            user=user,
-            recipe=recipe
-        ).delete()
-        return Response(
-            status=HTTPStatus.NO_CONTENT
+    def get_object_validators(self):
+        user = self.request.user
+        if self.action == 'me':
+            pk = user.pk
+        else:
+            pk = self.kwargs[self.lookup_field]
+        try:
+            row = self.get_queryset().filter(pk=pk).values_list(
+                'updated_at', 'is_subscribed'
+            ).first()
+        except ValueError:
+            return None
+        if row is None:
+            return None
+        updated_at, is_subscribed = row
+        if user.is_authenticated:
+            return make_etag('user', pk, updated_at, is_subscribed), None
+        return make_etag('user', pk, updated_at), updated_at
+
+    def get_list_validators(self):
+        if self.request.user.is_authenticated:
+            return None
+        summary = self.filter_queryset(self.get_queryset()).aggregate(
+            count=Count('id'), updated_at=Max('updated_at')
         )
+        return make_etag(
+            'users', self.request.get_full_path(), *summary.values()
+        ), summary['updated_at']
 
 
-class ShoppingCartAPIView(APIView):
+class RelationAPIView(APIView):
     """
-    Вью-класс для измнения списка покупок (добавление, удаление);
+    Базовый вью-класс для добавления и удаления связи
+    пользователя с объектом (api.relations.RelationToggle);
     для авторизованных пользователей.
     """
     permission_classes = (IsAuthenticated,)
+    relation = None
+    exists_error = None
+    missing_error = None
+    missing_status = HTTPStatus.BAD_REQUEST
+
+    def check_target(self, request, target):
+        """
+        Ответ с ошибкой, если связь с объектом недопустима.
+        """
+        return None
+
+    def get_response_data(self, request, target):
+        return ShowShortRecipeSerializer(
+            target, context={'request': request}
+        ).data
 
     def post(self, request, id):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        if ShoppingCart.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists():
+        target = get_object_or_404(self.relation.target_model, id=id)
+        response = self.check_target(request, target)
+        if response is not None:
+            return response
+        if not self.relation.add(request.user, target.pk):
             return Response(
-                {'errors': 'Этот рецепт уже есть в списке покупок'},
+                {'errors': self.exists_error},
                 status=HTTPStatus.BAD_REQUEST
             )
-        ShoppingCart.objects.create(
-            user=user,
-            recipe=recipe
-        )
         return Response(
-            ShowShortRecipeSerializer(recipe).data,
+            self.get_response_data(request, target),
             status=HTTPStatus.CREATED
         )
 
     def delete(self, request, id):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        if not ShoppingCart.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists():
-            return Response(
-                {'errors': 'Такого рецепта нет в списке покупок'},
-                status=HTTPStatus.NO_CONTENT
-            )
-        ShoppingCart.objects.get(
-            user=user,
-            recipe=recipe
-        ).delete()
+        if self.relation.remove(request.user, id):
+            return Response(status=HTTPStatus.NO_CONTENT)
+        if not self.relation.target_model.objects.filter(id=id).exists():
+            raise Http404
         return Response(
-            status=HTTPStatus.NO_CONTENT
+            {'errors': self.missing_error},
+            status=self.missing_status
         )
 
 
+class RelationBatchAPIView(APIView):
+    """
+    Базовый вью-класс для пакетного добавления и удаления связей:
+    {"ids": [...]} → {"results": [{"id": ..., "status": ...}]}
+    в порядке переданных id; для авторизованных пользователей.
+    """
+    permission_classes = (IsAuthenticated,)
+    relation = None
+
+    def check_ids(self, request, ids):
+        """
+        Статусы id, для которых связь недопустима.
+        """
+        return {}
+
+    def process(self, request, method):
+        serializer = RelationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        results = self.check_ids(request, ids)
+        results.update(method(
+            request.user, [pk for pk in ids if pk not in results]
+        ))
+        return Response({'results': [
+            {'id': pk, 'status': results[pk]} for pk in ids
+        ]})
+
+    def post(self, request):
+        return self.process(request, self.relation.add_many)
+
+    def delete(self, request):
+        return self.process(request, self.relation.remove_many)
+
+
+class FavoriteAPIView(RelationAPIView):
+    """
+    Вью-класс для добавления рецептов в избранное и удаления из него;
+    для авторизованных пользователей.
+    """
+    relation = favorites
+    exists_error = 'Этот рецепт уже был добавлен в избранное'
+    missing_error = 'Такого рецепта нет в избранном'
+
+
+class ShoppingCartAPIView(RelationAPIView):
+    """
+    Вью-класс для измнения списка покупок (добавление, удаление);
+    для авторизованных пользователей.
+    """
+    relation = shopping_carts
+    exists_error = 'Этот рецепт уже есть в списке покупок'
+    missing_error = 'Такого рецепта нет в списке покупок'
+    missing_status = HTTPStatus.NO_CONTENT
+
+
+class FavoriteBatchAPIView(RelationBatchAPIView):
+    """
+    Вью-класс для пакетного изменения избранного.
+    """
+    relation = favorites
+
+
+class ShoppingCartBatchAPIView(RelationBatchAPIView):
+    """
+    Вью-класс для пакетного изменения списка покупок.
+    """
+    relation = shopping_carts
+
+
 class DownloadShoppingCartAPIView(APIView):
     """
     Вью-класс для формирования и скачивания списка покупок;
@@ -161,43 +435,53 @@ class DownloadShoppingCartAPIView(APIView):
     """
     permission_classes = (IsAuthenticated,)
 
+    def perform_content_negotiation(self, request, force=False):
+        # Параметр format выбирает формат файла, а не рендерер DRF.
+        return super().perform_content_negotiation(request, force=True)
+
     def get(self, request):
-        grocery_list = IngredientQuantity.objects.filter(
-            recipe__shopping_carts__user=request.user
-        ).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-            'amount'
-        )
-        final_grocery_list = {}
-        for item in grocery_list:
-            name = item[0]
-            if name not in final_grocery_list:
-                final_grocery_list[name] = {
-                    'measurement_unit': item[1],
-                    'amount': item[2]
-                }
-            else:
-                final_grocery_list[name]['amount'] += item[2]
-        pdfmetrics.registerFont(TTFont('Arial', 'data/arial.ttf', 'UTF-8'))
-        response = HttpResponse(content_type='application/pdf')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_list.pdf"'
-        page = canvas.Canvas(response)
-        page.setFont('Arial', 14)
-        page.drawString(250, 800, 'Список покупок:')
-        page.setFont('Arial', 14)
-        height = 750
-        for i, (name, data) in enumerate(final_grocery_list.items(), 1):
-            page.drawString(
-                75, height, (f'{i}) {name.capitalize()} - {data["amount"]} '
-                             f'{data["measurement_unit"]}.')
+        file_format = request.query_params.get('format', 'pdf')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Допустимые форматы: '
+                           + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        digest = get_cart_digest(request.user)
+        etag = quote_etag(f'{digest}-{file_format}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.build_document(request.user, digest, file_format)
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{file_format}"'
             )
-            height -= 25
-        page.showPage()
-        page.save()
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
         return response
 
+    def build_document(self, user, digest, file_format):
+        shopping_list = get_shopping_list(user)
+        if file_format in ('txt', 'csv'):
+            # Запрос выполняется до ответа: при потоковой отдаче он
+            # прошёл бы после InstrumentationMiddleware и мимо бюджета.
+            # Строк не больше, чем ингредиентов в справочнике.
+            shopping_list = list(shopping_list)
+        if file_format == 'txt':
+            return StreamingHttpResponse(
+                iter_txt(shopping_list),
+                content_type='text/plain; charset=utf-8'
+            )
+        if file_format == 'csv':
+            return StreamingHttpResponse(
+                iter_csv(shopping_list),
+                content_type='text/csv; charset=utf-8'
+            )
+        document = get_cached_document(digest, file_format)
+        if document is None:
+            document = render_shopping_list_pdf(shopping_list)
+            set_cached_document(digest, file_format, document)
+        return HttpResponse(document, content_type='application/pdf')
+
 
 class SubscriptionsView(ListAPIView):
     """
@@ -210,54 +494,58 @@ class SubscriptionsView(ListAPIView):
     def get_queryset(self):
         return User.objects.filter(
             subscriptions__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
         )
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        authors = list(page if page is not None else queryset)
+        previews = {author.pk: [] for author in authors}
+        for recipe in Recipe.objects.latest_per_author(
+            list(previews), get_recipes_limit(request)
+        ):
+            previews[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipe_previews = previews[author.pk]
+        serializer = self.get_serializer(authors, many=True)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
 
-class FollowAPIView(APIView):
+class FollowAPIView(RelationAPIView):
     """
     Вью-класс для создания и удаленя подписок;
     для авторизованных пользователей.
     """
-    permission_classes = (IsAuthenticated,)
+    relation = follows
+    exists_error = 'Такая подписка уже существует'
+    missing_error = 'Такой подписки не существует'
 
-    def post(self, request, id):
-        author = get_object_or_404(User, id=id)
-        if Follow.objects.filter(
-            author=id,
-            user=request.user
-        ).exists():
-            return Response(
-                {'errors': 'Такая подписка уже существует'},
-                status=HTTPStatus.BAD_REQUEST
-            )
-        if request.user == author:
+    def check_target(self, request, target):
+        if request.user == target:
             return Response(
                 {'errors': 'Нельзя подписаться на себя'},
                 status=HTTPStatus.BAD_REQUEST
             )
-        Follow.objects.create(
-            user=request.user,
-            author_id=id
-        )
-        return Response(
-            FollowAndSubscriptionsSerializer(author, context={'request': request}).data,
-            status=HTTPStatus.CREATED
-        )
+        return None
 
-    def delete(self, request, id):
-        get_object_or_404(User, id=id)
-        if not Follow.objects.filter(
-            author=id,
-            user=request.user
-        ).exists():
-            return Response(
-                {'errors': 'Такой подписки не существует'},
-                status=HTTPStatus.BAD_REQUEST
-            )
-        Follow.objects.get(
-            author=id,
-            user=request.user
-        ).delete()
-        return Response(
-            status=HTTPStatus.NO_CONTENT
-        )
+    def get_response_data(self, request, target):
+        target.is_subscribed = True
+        return FollowAndSubscriptionsSerializer(
+            target, context={'request': request}
+        ).data
+
+
+class FollowBatchAPIView(RelationBatchAPIView):
+    """
+    Вью-класс для пакетного создания и удаления подписок.
+    """
+    relation = follows
+
+    def check_ids(self, request, ids):
+        if request.method == 'POST' and request.user.pk in ids:
+            return {request.user.pk: SELF}
+        return {}
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -89,6 +90,79 @@ DATABASES = {
 }
 
 
+# Версии справочников (api.catalog) хранятся в кеше по умолчанию;
+# чтобы их видели все воркеры gunicorn, нужен общий кеш
+# (FileBasedCache, Memcached и т.п.).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    'shopping_lists': {
+        'BACKEND': os.getenv(
+            'SHOPPING_LIST_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(
+            'SHOPPING_LIST_CACHE_LOCATION', default='shopping-lists'
+        ),
+        'TIMEOUT': 60 * 60 * 24,
+    },
+}
+
+# Кеш сформированных списков покупок;
+# для нескольких воркеров подойдёт FileBasedCache или Memcached.
+SHOPPING_LIST_CACHE = 'shopping_lists'
+
+# Наибольшее количество ингредиентов в ответе поиска по названию.
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Наибольшее количество id в одном пакетном запросе
+# к избранному, списку покупок и подпискам.
+RELATION_BATCH_LIMIT = 100
+
+# Подбор рецептов по имеющимся ингредиентам (api.pantry): наибольшее
+# количество ингредиентов в запросе и записей журнала изменений,
+# которые воркер применяет к индексу вместо полной перестройки.
+PANTRY_INGREDIENTS_LIMIT = 100
+PANTRY_INDEX_MAX_CHANGES = 1000
+
+# Похожие рецепты (api.similarity): количество соседей, наибольшая
+# частота признака, участвующего в сравнении, размер пакета строк
+# при перестройке и фоновые потоки пересчёта (0 — сразу в запросе).
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_MAX_DF = 1000
+SIMILAR_RECIPES_BATCH_SIZE = 1000
+SIMILAR_RECIPES_WORKERS = int(os.getenv('SIMILAR_RECIPES_WORKERS', default=1))
+
+# Кеш токенов авторизации (api.authentication): размер и срок жизни
+# записей в памяти воркера и срок жизни записей в общем кеше.
+# Общий кеш используется, только если CACHES['default'] — не LocMemCache.
+AUTH_TOKEN_CACHE_SIZE = 10_000
+AUTH_TOKEN_CACHE_LOCAL_TTL = 10
+AUTH_TOKEN_CACHE_TTL = 60 * 5
+
+# Заголовок Server-Timing с количеством запросов к базе и временем
+# обработки (api.instrumentation).
+SERVER_TIMING = os.getenv('SERVER_TIMING', default=str(DEBUG)) == 'True'
+
+# Бюджеты запросов к базе по эндпоинтам; при QUERY_BUDGET_RAISE
+# превышение приводит к ошибке, иначе пишется в лог.
+QUERY_BUDGETS = 'api.urls.QUERY_BUDGETS'
+QUERY_BUDGET_RAISE = (
+    os.getenv('QUERY_BUDGET_RAISE', default='False') == 'True'
+)
+
+# Сколько секунд общие кеши (proxy_cache в nginx) могут отдавать
+# ответы на анонимные GET-запросы без перепроверки.
+ANONYMOUS_CACHE_MAX_AGE = int(
+    os.getenv('ANONYMOUS_CACHE_MAX_AGE', default=60)
+)
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -118,6 +192,23 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Изображения рецептов: наибольший размер загрузки, размеры
+# уменьшенных копий, их форматы и число фоновых потоков
+# (0 — копии создаются прямо в запросе).
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (150, 150),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+
+RECIPE_IMAGE_QUALITY = 80
+
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', default=2))
+
 STATIC_URL = '/backend-static/'
 
 # STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static/'),)
@@ -126,6 +217,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend-static')
 
 AUTH_USER_MODEL = 'users.User'
 
+# Вход в API — по адресу почты, в админку — по имени пользователя.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 REST_FRAMEWORK = {
 
     'DEFAULT_PERMISSION_CLASSES': [
@@ -133,11 +230,11 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': (
-        'rest_framework.pagination.PageNumberPagination'
+        'api.pagination.PageNumberOrCursorPagination'
     ),
 
     'PAGE_SIZE': 6,
@@ -149,6 +246,7 @@ DJOSER = {
         'user': 'api.serializers.ShowUserSerializer',
         'user_create': 'api.serializers.CreateUserSerializer',
         'current_user': 'api.serializers.ShowUserSerializer',
+        'token_create': 'api.serializers.EmailTokenCreateSerializer',
     },
     'HIDE_USERS': False,
     'PERMISSIONS': {
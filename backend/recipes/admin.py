@@ -26,9 +26,10 @@ class RecipeAdmin(admin.ModelAdmin):
         return False
 
     def add_to_favorite(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     add_to_favorite.short_description = 'Добавлено в избранное'
+    add_to_favorite.admin_order_field = 'favorites_count'
 
 
 @admin.register(IngredientQuantity)
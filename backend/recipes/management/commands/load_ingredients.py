@@ -0,0 +1,221 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from api.catalog import ingredients_catalog
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Ingredient
+
+DEFAULT_PATH = os.path.join(
+    settings.BASE_DIR, 'backend', 'data', 'ingredients.csv'
+)
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for name, measurement_unit in csv.reader(file):
+            yield name, measurement_unit
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """
+    Элементы JSON-массива верхнего уровня по одному: файл читается
+    порциями по chunk_size символов, в памяти — текущий элемент
+    и непрочитанный остаток порции.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        chunk = file.read(chunk_size)
+        buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+    def next_char():
+        # Первый непробельный символ; пустая строка — конец файла.
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            read_more()
+
+    if next_char() != '[':
+        raise ValueError('Ожидается JSON-массив')
+    position += 1
+    if next_char() == ']':
+        return
+    while True:
+        next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more()
+                continue
+            # Элемент, дочитанный до конца порции, мог оборваться
+            # (например, число): дочитываем и разбираем снова.
+            if end == len(buffer) and not eof:
+                read_more()
+                continue
+            break
+        position = end
+        yield item
+        char = next_char()
+        position += 1
+        if char == ']':
+            return
+        if char != ',':
+            raise ValueError(
+                f'Ожидается «,» или «]» в JSON-массиве, получено «{char}»'
+            )
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in iter_json_array(file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class RowsReader:
+    """
+    Файловый объект для copy_expert: отдаёт строки генератора
+    в формате CSV порциями, не загружая файл целиком.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.writer = csv.writer(self)
+        self.buffer = ''
+        self.total = 0
+
+    def write(self, value):
+        self.buffer += value
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.total += 1
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON (массив объектов); '
+            'оба формата читаются потоково. Уже существующие пары '
+            '(название, единица) пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу с ингредиентами.'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(READERS),
+            help='Формат файла; по умолчанию — по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT.'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузка через COPY (только PostgreSQL).'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.')
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if not os.path.exists(path):
+            raise CommandError(f'Файл не найден: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только в PostgreSQL')
+        rows = READERS[file_format](path)
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        with transaction.atomic():
+            if options['copy']:
+                total = self.copy(rows)
+            else:
+                total = self.insert(rows, options['batch_size'])
+        created = Ingredient.objects.count() - before
+        if created:
+            # bulk_create и COPY не отправляют сигналы.
+            ingredients_catalog.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total}, добавлено: {created}, '
+            f'за {elapsed:.3f} с ({total / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+
+    def insert(self, rows, batch_size):
+        total = 0
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in batch),
+                ignore_conflicts=True
+            )
+            total += len(batch)
+        return total
+
+    def copy(self, rows):
+        """
+        Потоковая загрузка через COPY во временную таблицу
+        и перенос новых строк одним INSERT ... ON CONFLICT DO NOTHING.
+        """
+        table = Ingredient._meta.db_table
+        source = RowsReader(rows)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredients_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredients_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                source
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredients_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+        return source.total
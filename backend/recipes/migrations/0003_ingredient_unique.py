@@ -0,0 +1,52 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:07
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Уникальное ограничение не создастся, если ингредиенты уже
+    повторяются (например, справочник загружали дважды): повторы
+    объединяются в ингредиент с наименьшим id, рецепты переводятся
+    на него.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientQuantity = apps.get_model('recipes', 'IngredientQuantity')
+    groups = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keep'])
+        IngredientQuantity.objects.filter(
+            ingredient__in=duplicates
+        ).update(ingredient_id=group['keep'])
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+    # Объединение повторов фиксируется отдельной транзакцией: в
+    # PostgreSQL ALTER TABLE не выполняется, пока в той же транзакции
+    # ждут проверки отложенные внешние ключи удалённых строк.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0002_auto_20221125_0145'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ('id',), 'verbose_name': 'ингредиент', 'verbose_name_plural': 'Ингредиенты'},
+        ),
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop,
+            atomic=True
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique ingredient'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:09
+
+from django.db import migrations, models
+import recipes.storages
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storages.ContentAddressedStorage(), upload_to='', verbose_name='Изображение блюда'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:40
+
+from django.db import migrations
+
+# Поисковый индекс не описывается моделью: в PostgreSQL это
+# вычисляемый столбец tsvector с GIN-индексом, в SQLite — таблица
+# FTS5, которую поддерживают триггеры. Обе формы обновляются самой
+# базой, в том числе при bulk_create и массовом удалении.
+POSTGRESQL_FORWARD = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, coalesce(text, '')),"
+    " 'B')) STORED",
+    'CREATE INDEX recipe_search_vector ON recipes_recipe '
+    'USING GIN (search_vector)',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX recipe_search_vector',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+# Триггеры по именам: api.recipe_search восстанавливает их после
+# миграций, пересобирающих таблицу recipes_recipe в SQLite.
+SQLITE_TRIGGERS = {
+    'recipes_recipe_search_insert': (
+        'CREATE TRIGGER recipes_recipe_search_insert AFTER INSERT '
+        'ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_search (rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'
+    ),
+    'recipes_recipe_search_delete': (
+        'CREATE TRIGGER recipes_recipe_search_delete AFTER DELETE '
+        'ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_search '
+        '(recipes_recipe_search, rowid, name, text) '
+        "VALUES ('delete', old.id, old.name, old.text); END"
+    ),
+    'recipes_recipe_search_update': (
+        'CREATE TRIGGER recipes_recipe_search_update '
+        'AFTER UPDATE OF name, text ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_search '
+        '(recipes_recipe_search, rowid, name, text) '
+        "VALUES ('delete', old.id, old.name, old.text); "
+        'INSERT INTO recipes_recipe_search (rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'
+    ),
+}
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_search (recipes_recipe_search) "
+    "VALUES ('rebuild')"
+)
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE recipes_recipe_search USING fts5("
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    *SQLITE_TRIGGERS.values(),
+    "INSERT INTO recipes_recipe_search (recipes_recipe_search, rank) "
+    "VALUES ('rank', 'bm25(2.0, 1.0)')",
+    SQLITE_REBUILD,
+)
+SQLITE_BACKWARD = (
+    'DROP TRIGGER recipes_recipe_search_insert',
+    'DROP TRIGGER recipes_recipe_search_delete',
+    'DROP TRIGGER recipes_recipe_search_update',
+    'DROP TABLE recipes_recipe_search',
+)
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run_statements(direction):
+    def run(apps, schema_editor):
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        if statements is None:
+            return
+        for sql in statements[direction]:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_statements(0), run_statements(1)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Ключи «копия.формат» через пробел (api.images).', max_length=200, verbose_name='Готовые копии изображения'),
+        ),
+    ]
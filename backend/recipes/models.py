@@ -1,7 +1,11 @@
 from colorfield.fields import ColorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
-from users.models import User
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+from recipes.storages import ContentAddressedStorage
+from users.models import Follow, User
 
 
 class Tag(models.Model):
@@ -54,11 +58,87 @@ class Ingredient(models.Model):
         verbose_name = 'ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов для рецептов.
+    """
+
+    def with_user_annotations(self, user):
+        """
+        Добавляет к рецептам признаки избранного, списка покупок
+        и подписки на автора для пользователя, а также подгружает
+        автора, теги и ингредиенты, чтобы сериализация страницы
+        не зависела от количества рецептов.
+        """
+        return self.select_related('author').prefetch_related(
+            # Теги целиком: строки маленькие, а сериализатор берёт их,
+            # если тега ещё нет в справочнике (api.catalog).
+            'tags',
+            Prefetch(
+                'ingredients_quantities',
+                queryset=IngredientQuantity.objects.select_related(
+                    'ingredient'
+                )
+            )
+        ).with_user_flags(user)
+
+    def with_user_flags(self, user):
+        """
+        Признаки избранного, списка покупок и подписки на автора
+        для пользователя в виде подзапросов EXISTS.
+        """
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def latest_per_author(self, author_ids, limit):
+        """
+        Не более limit последних рецептов каждого автора одним
+        запросом: ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        if not author_ids:
+            return []
+        ranked = self.filter(author_id__in=author_ids).order_by().annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('id').desc()
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            'ORDER BY author_id, id DESC',
+            (*params, limit)
+        )
+
+
 class Recipe(models.Model):
     """
     Рецепты.
@@ -85,8 +165,17 @@ class Recipe(models.Model):
         verbose_name='Название рецепта'
     )
     image = models.ImageField(
+        storage=ContentAddressedStorage(),
         verbose_name='Изображение блюда'
     )
+    image_variants = models.CharField(
+        max_length=200,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Готовые копии изображения',
+        help_text='Ключи «копия.формат» через пробел (api.images).'
+    )
     text = models.TextField(
         verbose_name='Процесс приготовления',
     )
@@ -100,11 +189,33 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления, мин.',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлено в избранное',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлено в списки покупок',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты авторов'
         ordering = ('-id',)
+        indexes = [
+            models.Index(
+                fields=('author', '-id'),
+                name='recipe_author_id_desc'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -198,3 +309,36 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Похожие рецепты: ближайшие соседи рецепта по ингредиентам
+    и тегам, вычисляются в api.similarity.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'), name='unique similar recipe'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} → {self.similar}'
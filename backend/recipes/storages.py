@@ -0,0 +1,37 @@
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ADDRESSED_NAME = re.compile(
+    r'^(.*/)?[0-9a-f]{64}(/[\w-]+)?(\.[0-9a-z]+)?$'
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором файл с именем по хешу содержимого
+    записывается один раз: повторная загрузка того же файла
+    возвращает уже сохранённое имя.
+    """
+
+    @staticmethod
+    def is_content_addressed(name):
+        return bool(CONTENT_ADDRESSED_NAME.match(name))
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not self.is_content_addressed(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        # Одинаковое содержимое могут записывать параллельно,
+        # поэтому файл пишется под временным именем и переносится.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,158 @@
+import pytest
+from api import instrumentation
+from api.authentication import token_cache
+from api.catalog import ingredients_catalog, tags_catalog
+from django.core.cache import caches
+from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                            ShoppingCart, Tag)
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+PASSWORD = 'Tomato-basil-2024'
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Версии справочников, дайджесты списков покупок и токены живут
+    в кешах процесса и не откатываются вместе с базой.
+    """
+    for name in ('default', 'shopping_lists'):
+        caches[name].clear()
+    token_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def synchronous_jobs(settings):
+    """
+    Копии изображений и похожие рецепты считаются прямо в запросе:
+    фоновые потоки не видят данных транзакции теста.
+    """
+    settings.IMAGE_PIPELINE_WORKERS = 0
+    settings.SIMILAR_RECIPES_WORKERS = 0
+
+
+def make_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password=PASSWORD,
+        first_name='Test',
+        last_name='User',
+    )
+
+
+@pytest.fixture
+def author(db):
+    return make_user('author')
+
+
+@pytest.fixture
+def user(db):
+    return make_user('reader')
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}',
+                           color=f'#00000{number}')
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(40)
+    )
+    return list(Ingredient.objects.order_by('id'))
+
+
+@pytest.fixture
+def make_recipe(author, tags, ingredients):
+    """
+    Рецепт автора со всеми тегами и ingredients_count ингредиентами.
+    """
+    def make(ingredients_count=3, **fields):
+        recipe = Recipe.objects.create(**{
+            'author': author, 'name': 'Рецепт', 'text': 'Описание',
+            'cooking_time': 10, 'image': 'recipe.png', **fields
+        })
+        recipe.tags.set(tags)
+        IngredientQuantity.objects.bulk_create(
+            IngredientQuantity(recipe=recipe, ingredient=ingredient,
+                               amount=number + 1)
+            for number, ingredient in enumerate(
+                ingredients[:ingredients_count]
+            )
+        )
+        return recipe
+    return make
+
+
+@pytest.fixture
+def recipes(make_recipe, author, user):
+    """
+    Десять рецептов; часть из них в избранном и в списке покупок
+    пользователя, который подписан на автора.
+    """
+    recipes = [make_recipe() for _ in range(10)]
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::2]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in recipes[::3]
+    )
+    Follow.objects.create(user=user, author=author)
+    return recipes
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def measure():
+    """
+    Выполняет запрос и возвращает количество запросов к базе так,
+    как его считает InstrumentationMiddleware (без фоновых задач),
+    и ответ. Справочники загружаются заранее: это делается один раз
+    на процесс, а не на запрос.
+    """
+    recorded = []
+
+    def record(name, method, stats):
+        if method != instrumentation.JOB:
+            recorded.append(stats)
+
+    def measure(method, url, data=None, status=200):
+        tags_catalog.get_state()
+        ingredients_catalog.get_state()
+        recorded.clear()
+        response = method(url, data, format='json')
+        assert response.status_code == status, getattr(
+            response, 'data', response
+        )
+        return recorded[-1].queries, response
+
+    instrumentation.listeners.append(record)
+    yield measure
+    instrumentation.listeners.remove(record)
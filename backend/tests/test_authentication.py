@@ -0,0 +1,34 @@
+import pytest
+from api.authentication import token_cache
+
+
+@pytest.fixture
+def file_cache(settings, tmp_path):
+    settings.CACHES = {
+        **settings.CACHES,
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        },
+    }
+
+
+@pytest.mark.django_db
+def test_process_local_cache_is_not_used_as_shared_tier(user):
+    assert token_cache.get_shared_cache() is None
+    token_cache.set('token', user)
+    assert token_cache.get('token') == user
+    # После clear() кеш выглядит как память другого воркера: запись
+    # из LocMemCache, до которой не дошёл бы сброс, он брать не должен.
+    token_cache.clear()
+    assert token_cache.get('token') is None
+
+
+@pytest.mark.django_db
+def test_shared_cache_reaches_other_workers(user, file_cache):
+    token_cache.set('token', user)
+    token_cache.clear()
+    assert token_cache.get('token') == user
+    token_cache.invalidate(['token'])
+    token_cache.clear()
+    assert token_cache.get('token') is None
@@ -0,0 +1,40 @@
+from unittest import mock
+
+import pytest
+from api.catalog import VERSION_KEY, tags_catalog
+from api.pantry import pantry_index
+from django.core.cache import caches
+from django.db import transaction
+from recipes.models import Tag
+
+
+def test_catalog_version_is_read_once_per_request(anonymous_client, recipes):
+    cache = caches['default']
+    tags_catalog.get_version()
+    with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+        response = anonymous_client.get('/api/recipes/?limit=6')
+    assert response.status_code == 200
+    version_reads = [
+        call for call in get.call_args_list
+        if call.args[0] == VERSION_KEY.format(name='tags')
+    ]
+    assert len(version_reads) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_catalog_is_invalidated_after_commit():
+    version = tags_catalog.get_version()
+    with transaction.atomic():
+        Tag.objects.create(name='Новый', slug='new', color='#123456')
+        assert tags_catalog.get_version() == version
+    assert tags_catalog.get_version() != version
+    assert [tag['slug'] for tag in tags_catalog.all()] == ['new']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_pantry_index_is_invalidated_after_commit():
+    version = pantry_index.get_version()
+    with transaction.atomic():
+        pantry_index.invalidate()
+        assert pantry_index.get_version() == version
+    assert pantry_index.get_version() != version
@@ -0,0 +1,27 @@
+from unittest import mock
+
+import pytest
+from conftest import PASSWORD
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('email', ('reader@example.com', 'nobody@example.com'))
+def test_failed_email_login_hashes_once(user, email):
+    hasher = get_hasher()
+    with mock.patch.object(
+        type(hasher), 'encode', autospec=True,
+        side_effect=type(hasher).encode
+    ) as encode:
+        with CaptureQueriesContext(connection) as queries:
+            assert authenticate(email=email, password='wrong') is None
+    assert encode.call_count == 1
+    assert len(queries) == 1
+
+
+@pytest.mark.django_db
+def test_email_login_is_case_insensitive(user):
+    assert authenticate(email='Reader@Example.com', password=PASSWORD) == user
@@ -0,0 +1,82 @@
+import base64
+import binascii
+import os
+
+import pytest
+from api.images import CHUNK_SIZE, ImageTooLarge, decode_base64_image
+from api.management.commands.query_report import make_image
+from recipes.models import Recipe
+
+CONTENT = os.urandom(CHUNK_SIZE * 2 + 7)
+
+
+@pytest.mark.parametrize('encode', (
+    base64.b64encode,
+    base64.encodebytes,
+    lambda data: base64.encodebytes(data).replace(b'\n', b'\r\n '),
+))
+def test_decode_base64_image(encode):
+    file = decode_base64_image(encode(CONTENT).decode(), 'png', 10 ** 6)
+    assert file.read() == CONTENT
+    assert file.name.endswith('.png')
+
+
+def test_decode_base64_image_checks_decoded_size():
+    encoded = base64.encodebytes(CONTENT).decode()
+    decode_base64_image(encoded, 'png', len(CONTENT))
+    with pytest.raises(ImageTooLarge):
+        decode_base64_image(encoded, 'png', len(CONTENT) - 1)
+
+
+def test_decode_base64_image_rejects_truncated_payload():
+    with pytest.raises(binascii.Error):
+        decode_base64_image(base64.b64encode(CONTENT).decode()[:-1],
+                            'png', 10 ** 6)
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.mark.django_db
+def test_missing_variants_fall_back_to_image(make_recipe, anonymous_client):
+    recipe = make_recipe(image_variants='thumbnail.webp')
+    variants = anonymous_client.get(
+        f'/api/recipes/{recipe.pk}/'
+    ).json()['image_variants']
+    assert variants['thumbnail']['webp'].endswith(
+        '/variants/recipe/thumbnail.webp'
+    )
+    assert variants['thumbnail']['jpeg'].endswith('/recipe.png')
+    assert variants['detail']['webp'].endswith('/recipe.png')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_generated_variants_are_recorded(
+    media_root, author_client, tags, ingredients
+):
+    response = author_client.post('/api/recipes/', {
+        'tags': [tags[0].pk],
+        'ingredients': [{'id': ingredients[0].pk, 'amount': 5}],
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 5,
+        'image': make_image(),
+    }, format='json')
+    assert response.status_code == 201
+    recipe = Recipe.objects.get(pk=response.data['id'])
+    assert len(recipe.image_variants.split()) == 6
+    variants = author_client.get(
+        f'/api/recipes/{recipe.pk}/'
+    ).json()['image_variants']
+    assert variants['card']['jpeg'].startswith('http://testserver/')
+    assert '/variants/' in variants['card']['jpeg']
+
+
+@pytest.mark.django_db
+def test_relation_response_has_absolute_image_urls(make_recipe, user_client):
+    recipe = make_recipe()
+    response = user_client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    assert response.status_code == 201
+    assert response.data['image'].startswith('http://testserver/')
@@ -0,0 +1,35 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from recipes.management.commands.load_ingredients import iter_json_array
+from recipes.models import Ingredient
+
+ITEMS = [
+    {'name': 'соль', 'measurement_unit': 'г'},
+    {'name': 'молоко', 'measurement_unit': 'мл', 'amount': [1, 250]},
+    12345,
+]
+
+
+@pytest.mark.parametrize('chunk_size', (1, 2, 7, 1024))
+def test_iter_json_array_reads_in_chunks(chunk_size):
+    text = ' [\n' + ' ,\n'.join(json.dumps(item) for item in ITEMS) + '\n]'
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize('text', ('', '{}', '[1 2]', '[1,', '[{"a": 1}'))
+def test_iter_json_array_rejects_invalid_input(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), 2))
+
+
+@pytest.mark.django_db
+def test_load_ingredients_from_json(tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps(ITEMS[:2] * 2), encoding='utf-8')
+    call_command('load_ingredients', str(path), stdout=io.StringIO())
+    assert sorted(Ingredient.objects.values_list(
+        'name', 'measurement_unit'
+    )) == [('молоко', 'мл'), ('соль', 'г')]
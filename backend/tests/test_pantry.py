@@ -0,0 +1,38 @@
+import pytest
+from api.pantry import CHANGE_KEY, CHANGES_KEY, pantry_index
+from django.core.cache import cache
+
+
+def journal():
+    version = pantry_index.get_version()
+    count = cache.get(CHANGES_KEY.format(version=version), 0)
+    return [
+        cache.get(CHANGE_KEY.format(version=version, number=number))
+        for number in range(1, count + 1)
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_recipe_delete_writes_one_journal_entry(make_recipe, author_client):
+    recipe = make_recipe(6)
+    before = journal()
+    response = author_client.delete(f'/api/recipes/{recipe.pk}/')
+    assert response.status_code == 204
+    assert journal()[len(before):] == [[recipe.pk]]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ingredients_update_writes_one_journal_entry(
+    make_recipe, author_client
+):
+    recipe = make_recipe(6)
+    before = journal()
+    quantities = list(recipe.ingredients_quantities.all())
+    response = author_client.patch(f'/api/recipes/{recipe.pk}/', {
+        'ingredients': [
+            {'id': quantity.ingredient_id, 'amount': quantity.amount + 1}
+            for quantity in quantities[:2]
+        ],
+    }, format='json')
+    assert response.status_code == 200
+    assert journal()[len(before):] == [[recipe.pk]]
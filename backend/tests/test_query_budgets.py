@@ -0,0 +1,88 @@
+from io import StringIO
+
+import pytest
+from api import instrumentation
+from api.catalog import ingredients_catalog, tags_catalog
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def recorded():
+    """
+    Показатели всех запросов и фоновых задач: (имя, метод, запросов).
+    """
+    records = []
+
+    def record(name, method, stats):
+        records.append((name, method, stats.queries))
+
+    instrumentation.listeners.append(record)
+    yield records
+    instrumentation.listeners.remove(record)
+
+
+@pytest.fixture
+def token_client(author):
+    """
+    Клиент с настоящим токеном: авторизация входит в бюджет.
+    """
+    token = Token.objects.create(user=author)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def ingredients_data(ingredients, count, amount):
+    return [
+        {'id': ingredient.pk, 'amount': amount}
+        for ingredient in ingredients[:count]
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('count', (2, 30))
+def test_recipe_endpoints_fit_query_budgets(
+    recorded, token_client, anonymous_client, tags, ingredients, count
+):
+    tags_catalog.get_state()
+    ingredients_catalog.get_state()
+    response = token_client.post('/api/recipes/', {
+        'tags': [tag.pk for tag in tags],
+        'ingredients': ingredients_data(ingredients, count, 5),
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 15,
+    }, format='json')
+    assert response.status_code == 201
+    url = f'/api/recipes/{response.data["id"]}/'
+    response = token_client.patch(url, {
+        'ingredients': ingredients_data(ingredients, count, 6),
+    }, format='json')
+    assert response.status_code == 200
+    for client in (anonymous_client, token_client):
+        assert client.get('/api/recipes/').status_code == 200
+        assert client.get(url).status_code == 200
+    assert token_client.delete(url).status_code == 204
+    assert {(name, method) for name, method, _ in recorded} >= {
+        ('recipies-list', 'POST'),
+        ('recipies-detail', 'PATCH'),
+        ('recipies-detail', 'DELETE'),
+        ('recipies-list', 'GET'),
+        ('recipies-detail', 'GET'),
+        ('similar-recipes-refresh', instrumentation.JOB),
+    }
+    over_budget = [
+        (name, method, queries)
+        for name, method, queries in recorded
+        if queries > instrumentation.get_query_budget(name, method)
+    ]
+    assert over_budget == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_query_report_fits_query_budgets():
+    # Все эндпоинты API: при превышении бюджета команда завершается
+    # CommandError со списком превышений.
+    call_command('query_report', check=True, repeat=2, stdout=StringIO())
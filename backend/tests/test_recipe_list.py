@@ -0,0 +1,59 @@
+from unittest import mock
+
+import pytest
+from api.catalog import tags_catalog
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(queries), response.json()
+
+
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'user_client'))
+def test_recipe_list_queries_do_not_depend_on_page_size(
+    request, client_name, recipes
+):
+    client = request.getfixturevalue(client_name)
+    # Первый запрос загружает справочники в память процесса.
+    count_queries(client, '/api/recipes/?limit=1')
+    small, small_page = count_queries(client, '/api/recipes/?limit=2')
+    large, large_page = count_queries(client, '/api/recipes/?limit=10')
+    assert len(small_page['results']) == 2
+    assert len(large_page['results']) == 10
+    assert small == large
+
+
+def test_recipe_list_flags(user_client, recipes):
+    _, page = count_queries(user_client, '/api/recipes/?limit=10')
+    flags = {
+        recipe['id']: (
+            recipe['is_favorited'],
+            recipe['is_in_shopping_cart'],
+            recipe['author']['is_subscribed'],
+        )
+        for recipe in page['results']
+    }
+    assert flags == {
+        recipe.pk: (number % 2 == 0, number % 3 == 0, True)
+        for number, recipe in enumerate(recipes)
+    }
+
+
+def test_recipe_list_queries_with_stale_tags_catalog(
+    anonymous_client, recipes, tags
+):
+    count_queries(anonymous_client, '/api/recipes/?limit=10')
+    fresh, fresh_page = count_queries(
+        anonymous_client, '/api/recipes/?limit=10'
+    )
+    # Теги, которых ещё нет в справочнике, берутся из подгруженных строк.
+    with mock.patch.object(tags_catalog, 'get', return_value=None):
+        stale, stale_page = count_queries(
+            anonymous_client, '/api/recipes/?limit=10'
+        )
+    assert stale == fresh
+    assert stale_page == fresh_page
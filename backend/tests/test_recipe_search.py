@@ -0,0 +1,56 @@
+import pytest
+from api.recipe_search import restore_search_index
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from recipes.models import Recipe
+
+
+def search_ids(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+@pytest.mark.django_db
+def test_search_ignores_cursor_and_keeps_ranking(
+    anonymous_client, make_recipe
+):
+    # Более релевантный рецепт старше: сортировка модели по -id
+    # дала бы обратный порядок.
+    in_name = make_recipe(name='Томатный суп', text='Описание')
+    in_text = make_recipe(name='Суп', text='Томатный соус')
+    make_recipe(name='Каша', text='Описание')
+    ranked = search_ids(anonymous_client, '/api/recipes/?search=томат')
+    assert ranked == [in_name.pk, in_text.pk]
+    assert search_ids(
+        anonymous_client, '/api/recipes/?search=томат&cursor='
+    ) == ranked
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'sqlite', reason='триггеры FTS5 есть только в SQLite'
+)
+@pytest.mark.django_db(transaction=True)
+def test_search_index_is_restored_after_table_rebuild(
+    anonymous_client, make_recipe
+):
+    old_field = Recipe._meta.get_field('name')
+    new_field = Recipe._meta.get_field('name').clone()
+    new_field.set_attributes_from_name('name')
+    new_field.max_length += 1
+    # Изменение поля в SQLite пересобирает таблицу, и её триггеры
+    # удаляются вместе со старой.
+    with connection.schema_editor() as editor:
+        editor.alter_field(Recipe, old_field, new_field)
+    try:
+        before = make_recipe(name='Томатный суп')
+        emit_post_migrate_signal(0, False, connection.alias)
+        assert not restore_search_index(connection)
+        after = make_recipe(name='Томатный соус')
+        assert sorted(search_ids(
+            anonymous_client, '/api/recipes/?search=томат'
+        )) == [before.pk, after.pk]
+    finally:
+        with connection.schema_editor() as editor:
+            editor.alter_field(Recipe, new_field, old_field)
+        restore_search_index(connection)
@@ -0,0 +1,63 @@
+import pytest
+
+
+def recipe_data(tags, ingredients, count):
+    return {
+        'tags': [tag.pk for tag in tags],
+        'ingredients': [
+            {'id': ingredient.pk, 'amount': 5}
+            for ingredient in ingredients[:count]
+        ],
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 15,
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_create_queries_do_not_depend_on_ingredients(
+    measure, author_client, tags, ingredients
+):
+    counts = []
+    for count in (2, 30):
+        queries, response = measure(
+            author_client.post, '/api/recipes/',
+            recipe_data(tags, ingredients, count), status=201
+        )
+        assert len(response.data['ingredients']) == count
+        counts.append(queries)
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('change', ('name', 'amounts'))
+def test_update_queries_do_not_depend_on_ingredients(
+    measure, author_client, make_recipe, change
+):
+    counts = []
+    for count in (2, 30):
+        recipe = make_recipe(count)
+        if change == 'name':
+            data = {'name': 'Другое название'}
+        else:
+            data = {'ingredients': [
+                {'id': quantity.ingredient_id, 'amount': quantity.amount + 1}
+                for quantity in recipe.ingredients_quantities.all()
+            ]}
+        queries, response = measure(
+            author_client.patch, f'/api/recipes/{recipe.pk}/', data
+        )
+        assert len(response.data['ingredients']) == count
+        counts.append(queries)
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('tag_ids', ([], [0]))
+def test_create_rejects_empty_or_invalid_tags(
+    author_client, tags, ingredients, tag_ids
+):
+    data = dict(recipe_data(tags, ingredients, 2), tags=tag_ids)
+    response = author_client.post('/api/recipes/', data, format='json')
+    assert response.status_code == 400
+    assert 'tags' in response.data
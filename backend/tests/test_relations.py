@@ -0,0 +1,41 @@
+import pytest
+from api.relations import CREATED, DELETED, EXISTS, MISSING, favorites
+
+
+def counters(recipes):
+    for recipe in recipes:
+        recipe.refresh_from_db()
+    return [recipe.favorites_count for recipe in recipes]
+
+
+def stale_snapshot(monkeypatch, linked):
+    """
+    read_batch возвращает снимок, прочитанный до параллельного запроса.
+    """
+    monkeypatch.setattr(
+        favorites, 'read_batch',
+        lambda user, target_ids: {pk: linked for pk in target_ids}
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_add_many_counts_only_inserted_rows(make_recipe, user, monkeypatch):
+    recipes = [make_recipe(2) for _ in range(2)]
+    ids = [recipe.pk for recipe in recipes]
+    assert favorites.add_many(user, ids) == dict.fromkeys(ids, CREATED)
+    assert counters(recipes) == [1, 1]
+    stale_snapshot(monkeypatch, False)
+    assert favorites.add_many(user, ids) == dict.fromkeys(ids, EXISTS)
+    assert counters(recipes) == [1, 1]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_remove_many_counts_only_deleted_rows(make_recipe, user, monkeypatch):
+    recipes = [make_recipe(2) for _ in range(2)]
+    ids = [recipe.pk for recipe in recipes]
+    favorites.add_many(user, ids)
+    assert favorites.remove_many(user, ids) == dict.fromkeys(ids, DELETED)
+    assert counters(recipes) == [0, 0]
+    stale_snapshot(monkeypatch, True)
+    assert favorites.remove_many(user, ids) == dict.fromkeys(ids, MISSING)
+    assert counters(recipes) == [0, 0]
@@ -0,0 +1,59 @@
+import pytest
+from api.catalog import ingredients_catalog, tags_catalog
+from api.shopping_list import (DIGEST_KEY, get_cache, get_cart_digest,
+                               get_generation)
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from recipes.models import ShoppingCart
+from rest_framework.test import APIClient
+
+
+def delete_recipe(author, recipe):
+    client = APIClient()
+    client.force_authenticate(author)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.delete(f'/api/recipes/{recipe.pk}/')
+    assert response.status_code == 204
+    return len(queries)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_recipe_delete_queries_do_not_depend_on_ingredients(
+    make_recipe, author, user
+):
+    small, large = make_recipe(2), make_recipe(30)
+    for recipe in (small, large):
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    assert delete_recipe(author, small) == delete_recipe(author, large)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cart_digest_is_invalidated_after_commit(make_recipe, user):
+    recipe = make_recipe(2)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    old_digest = get_cart_digest(user)
+    key = DIGEST_KEY.format(generation=get_generation(), user_id=user.pk)
+    with transaction.atomic():
+        quantity = recipe.ingredients_quantities.first()
+        quantity.amount += 1
+        quantity.save()
+        # Другой воркер успел сохранить дайджест старых строк.
+        get_cache().set(key, old_digest)
+    assert get_cart_digest(user) != old_digest
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('file_format', ('txt', 'csv'))
+def test_streamed_shopping_list_queries_are_counted(
+    measure, user_client, recipes, file_format
+):
+    tags_catalog.get_state()
+    ingredients_catalog.get_state()
+    with CaptureQueriesContext(connection) as captured:
+        queries, response = measure(
+            user_client.get,
+            f'/api/recipes/download_shopping_cart/?format={file_format}'
+        )
+        content = b''.join(response.streaming_content).decode()
+    assert 'Ингредиент 0' in content
+    assert queries == len(captured)
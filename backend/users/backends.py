@@ -0,0 +1,26 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from users.models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    Вход по адресу почты без учёта регистра. Пользователь ищется
+    одним запросом по уникальному индексу LOWER(email). Неудачный
+    вход по почте завершается PermissionDenied: иначе authenticate()
+    передал бы его следующему ModelBackend, и тот искал бы
+    пользователя с username = NULL и ещё раз хешировал пароль.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        user = User.objects.filter_by_email(email).first()
+        if user is None:
+            # Хеширование выравнивает время ответа для существующих
+            # и несуществующих адресов.
+            User().set_password(password)
+            raise PermissionDenied
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        raise PermissionDenied
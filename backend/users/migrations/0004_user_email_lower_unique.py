@@ -0,0 +1,54 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:31
+
+from django.db import IntegrityError, migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+import users.models
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Уникальный индекс не создастся, если адреса почты уже совпадают
+    без учёта регистра: такие учётные записи нужно объединить или
+    исправить вручную до применения миграции.
+    """
+    User = apps.get_model('users', 'User')
+    duplicates = list(
+        User.objects.annotate(email_lower=Lower('email')).order_by().values(
+            'email_lower'
+        ).annotate(total=Count('pk')).filter(total__gt=1).values_list(
+            'email_lower', flat=True
+        )
+    )
+    if duplicates:
+        raise IntegrityError(
+            'Адреса почты повторяются без учёта регистра, исправьте '
+            'учётные записи и повторите миграцию: '
+            + ', '.join(sorted(duplicates))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.UserManager()),
+            ],
+        ),
+        migrations.RunPython(
+            check_duplicate_emails, migrations.RunPython.noop
+        ),
+        # В Django 2.2 нет индексов по выражениям в Meta.indexes;
+        # такой синтаксис одинаков в PostgreSQL и SQLite.
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX users_user_email_lower_uniq '
+            'ON users_user (LOWER(email))',
+            'DROP INDEX users_user_email_lower_uniq',
+        ),
+    ]
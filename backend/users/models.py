@@ -1,5 +1,19 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.db import models
+from django.db.models.functions import Lower
+
+
+class UserManager(BaseUserManager):
+    """
+    Менеджер пользователей: поиск по адресу почты без учёта
+    регистра через уникальный индекс по LOWER(email).
+    """
+
+    def filter_by_email(self, email):
+        return self.annotate(
+            email_lower=Lower('email')
+        ).filter(email_lower=email.lower())
 
 
 class User(AbstractUser):
@@ -27,6 +41,22 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Фамилия',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    objects = UserManager()
 
     class Meta:
         verbose_name = 'Пользователь'